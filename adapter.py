@@ -1,15 +1,29 @@
-import os
+import time
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime
+from typing import List, Dict, Any
 
+import numpy as np
 import pandas as pd
 import requests
 import json
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+
+from storage import Storage, CSVStorage
+
+BASE_URL = 'https://clientes.balanz.com/api/v1'
+TIMEOUT = 10  # Seconds per request
 
 headers = {}
+session = requests.Session()
 
+# Where the recorded data is written, CSV by default
+storage: Storage = CSVStorage()
 
-def initialize_headers(token: str) -> None:
-    global headers
+
+def initialize_headers(token: str, pool_size: int = 16, retries: int = 3) -> None:
+    global headers, session
     headers = {
         'Accept': 'application/json',
         'Authorization': token,
@@ -21,24 +35,37 @@ def initialize_headers(token: str) -> None:
         'Sec-Fetch-Site': 'same-origin',
         'User-Agent': 'Mozilla/5.0 (Macintosh; Intel Mac OS X 10_15_7) AppleWebKit/605.1.15 (KHTML, like Gecko) Version/16.6 Safari/605.1.15'
     }
-    url = 'https://clientes.balanz.com/api/v1/banners'
-
-    try_login = requests.get(url, headers=headers)
+    url = f'{BASE_URL}/banners'
+
+    # Keep-alive connections shared by every request, retrying with backoff on connection errors and 429/5xx
+    session = requests.Session()
+    session.headers.update(headers)
+    adapter = HTTPAdapter(
+        pool_connections=pool_size,
+        pool_maxsize=pool_size,
+        max_retries=Retry(
+            total=retries,
+            backoff_factor=0.5,
+            status_forcelist=[429, 500, 502, 503, 504],
+            allowed_methods=['GET']
+        )
+    )
+    session.mount('https://', adapter)
+    session.mount('http://', adapter)
+
+    try_login = session.get(url, timeout=TIMEOUT)
     if try_login.status_code != 200:
         raise Exception("Error when logging in with current token")
 
 
-def filter_last_seq_number(df: pd.DataFrame, csv_path: str):
-    saved_df = pd.read_csv(csv_path)
-    last_sequence_number = saved_df['nrosecuencia'].max().item()
-    # Getting last sequence number
-    # with open(csv_path) as file:
-    #     for last_line in file:
-    #         pass
+def set_storage(backend: Storage) -> None:
+    global storage
+    storage.close()
+    storage = backend
 
-    # Filter
-    # last_sequence_number = int(last_line.split(',')[0])
-    return df[df['nrosecuencia'] > last_sequence_number]
+
+def close_files() -> None:
+    storage.close()
 
 
 def serialize_df(
@@ -47,49 +74,68 @@ def serialize_df(
         filter_by_seq_number: bool = True,
         mode: str = 'a'
 ) -> None:
-    path = "data/"
-    path += "-".join([prefix, str(datetime.now().date())])
-    path += '.csv'
-
-    create_file = False if os.path.isfile(path) and mode != 'w' else True
-    if filter_by_seq_number and not create_file:
-        df = filter_last_seq_number(df, path)
+    written = storage.write(df, prefix, filter_by_seq_number=filter_by_seq_number, mode=mode)
+    if written == 0 and 'GGAL' in prefix:
+        print(f'Warning {prefix} df is empty.')
 
-    if len(df) > 0:
-        df.to_csv(path, mode=mode, header=create_file)
-    else:
-        if 'GGAL' in prefix:
-            print(f'Warning {prefix} df is empty.')
 
+def fetch_prices(ticker: str, plazo: int) -> None:
+    url = f'{BASE_URL}/cotizacionintradiario?ticker={ticker}&plazo={plazo}&detalle=1&agrupado=0'
 
-def get_prices(ticker: str, plazo: int):
-    global headers
-    url = f'https://clientes.balanz.com/api/v1/cotizacionintradiario?ticker={ticker}&plazo={plazo}&detalle=1&agrupado=0'
+    r = session.get(url, timeout=TIMEOUT)
+    if r.status_code != 200:
+        raise Exception(f'Error when retrieving {ticker} history')
 
-    try:
-        r = requests.get(url, headers=headers)
-        if r.status_code != 200:
-            raise Exception(f'Error when retrieving {ticker} history')
+    content_dict = json.loads(r.content)['intradiario']
+    df = pd.DataFrame.from_dict(content_dict)
 
-        content_dict = json.loads(r.content)['intradiario']
-        df = pd.DataFrame.from_dict(content_dict)
+    if len(df) > 0:
+        df.sort_values(by=['nrosecuencia'], inplace=True)
 
-        if len(df) > 0:
-            df.sort_values(by=['nrosecuencia'], inplace=True)
+    serialize_df(df, f'OPERATIONS-{ticker}')
 
-        serialize_df(df, f'OPERATIONS-{ticker}')
 
+def get_prices(ticker: str, plazo: int):
+    try:
+        fetch_prices(ticker, plazo)
     except Exception as e:
         print(f"{str(datetime.now())} - {str(e)}")
         return pd.Series([])
 
 
+def poll_prices(tickers: List[str], plazo: int, workers: int = 16) -> Dict[str, Any]:
+    """
+    Retrieves the prices of every ticker concurrently and returns the sweep latency stats (seconds).
+    """
+    def timed_fetch(ticker: str) -> float:
+        start = time.monotonic()
+        try:
+            fetch_prices(ticker, plazo)
+        except Exception as e:
+            print(f"{str(datetime.now())} - {str(e)}")
+            return np.nan
+        return time.monotonic() - start
+
+    sweep_start = time.monotonic()
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        latencies = np.array(list(executor.map(timed_fetch, tickers)))
+    ok = latencies[~np.isnan(latencies)]
+
+    return {
+        'tickers': len(tickers),
+        'errors': int(np.isnan(latencies).sum()),
+        'sweep': time.monotonic() - sweep_start,
+        'p50': float(np.percentile(ok, 50)) if len(ok) > 0 else np.nan,
+        'p95': float(np.percentile(ok, 95)) if len(ok) > 0 else np.nan,
+        'max': float(ok.max()) if len(ok) > 0 else np.nan
+    }
+
+
 def get_ggal_options_names() -> pd.Series:
-    global headers
-    url = 'https://clientes.balanz.com/api/v1/cotizaciones/opciones?token=0&tokenindice=0&avoidAuthRedirect=true'
+    url = f'{BASE_URL}/cotizaciones/opciones?token=0&tokenindice=0&avoidAuthRedirect=true'
 
     try:
-        r = requests.get(url, headers=headers)
+        r = session.get(url, timeout=TIMEOUT)
         if r.status_code != 200:
             raise Exception('Error when retrieving GGAL history')
 
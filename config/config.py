@@ -5,13 +5,18 @@ from models.online.agent import Agent
 from models.asset import Asset
 from models.indicators.sample_indicator import VeryPowerfulIndicator, VeryPowerfulIndicatorConfiguration
 from models.input_source import BalanzWebsocketInputSource
+from models.online.bar_builder import BarBuilder
 from models.online.data_store import DataStore
 from models.online.input_store import InputStore
+from models.options.surface import VolatilitySurface
+from models.options.ticker import parse_option_ticker
 from models.output_source import BalanzRESTOutputSource
 from models.portfolio import Portfolio
 from models.strategies.sample_strategy import BestStrategyEver
 from models.strategies.strategy import StrategyConfiguration, Strategy
 
+RISK_FREE_RATE = 0.35  # Annual ARS rate used to price the options
+
 
 def main():
     manager = multiprocessing.Manager()
@@ -39,20 +44,33 @@ def main():
             )
         )
     ]
+    # Timeframed bars, updated on every tick and closed on timeframe boundaries
+    bar_builder = BarBuilder(indicators=Strategy.get_indicators_from_strategies(strategies))
+
+    # Implied volatilities of the options of the strategies, updated on every GGAL or option tick
+    assets = Strategy.get_assets_from_strategies(strategies)
+    surface = VolatilitySurface(
+        underlying=next(asset for asset in assets if asset.ticker == 'GGAL'),
+        options=[asset for asset in assets if parse_option_ticker(asset.ticker) is not None],
+        rate=RISK_FREE_RATE
+    )
+
     # Queue to notify when an asset is updated
     input_notification_queue = multiprocessing.Queue()
     # Obtains assets and notifies to queue when asset is updated
     input_store = InputStore(
-        assets=Strategy.get_assets_from_strategies(strategies),
+        assets=assets,
         input_notification_queue=input_notification_queue,
-        store=manager.dict()
+        bar_builder=bar_builder,
+        surface=surface
     )
 
     # Calculates indicators and assets grouped by timeframe
     data_store = DataStore(
         indicators=Strategy.get_indicators_from_strategies(strategies),
         input_store=input_store.store,
-        data_store=manager.dict()
+        data_store=manager.dict(),
+        bar_builder=bar_builder
     )
 
     agent = Agent(strategies=strategies, input_store=input_store, data_store=data_store)
@@ -2,22 +2,40 @@ import os.path
 import time
 from datetime import datetime
 
-from adapter import initialize_headers, get_ggal_options_names, get_prices
+from adapter import initialize_headers, get_ggal_options_names, poll_prices, close_files, set_storage
+from storage import ParquetStorage
 
 if __name__ == '__main__':
     if not os.path.isdir('data'):
         os.mkdir('data')
     os.environ['TOKEN'] = '505E3F28-E40F-4AE5-80C5-D823786CA516'
     initialize_headers(token=os.environ['TOKEN'])
+    # STORAGE=parquet records partitioned parquet files instead of one CSV per ticker and day
+    parquet_storage = ParquetStorage() if os.environ.get('STORAGE', 'csv') == 'parquet' else None
+    if parquet_storage is not None:
+        set_storage(parquet_storage)
     options_names = []
     while len(options_names) == 0:
         options_names = get_ggal_options_names()
         time.sleep(60)
     print(options_names)
-    while True:
-        print(f'Retrieving data at {str(datetime.now())}')
-        get_prices('GGAL', plazo=1)
-        for option_name in options_names:
-            get_prices(option_name, plazo=1)
+    day = datetime.now().date()
+    try:
+        while True:
+            if parquet_storage is not None and datetime.now().date() != day:
+                # Merging the intraday parts of the day that ended
+                parquet_storage.compact(day)
+                day = datetime.now().date()
 
-        time.sleep(30)
\ No newline at end of file
+            print(f'Retrieving data at {str(datetime.now())}')
+            stats = poll_prices(['GGAL'] + list(options_names), plazo=1)
+            print(
+                f"Sweep of {stats['tickers']} tickers in {stats['sweep']:.2f}s - errors: {stats['errors']} - "
+                f"p50: {stats['p50']:.3f}s p95: {stats['p95']:.3f}s max: {stats['max']:.3f}s"
+            )
+
+            # Keep a 30 seconds interval between sweeps
+            time.sleep(max(0, 30 - stats['sweep']))
+    finally:
+        # Flushing and syncing the recorded files
+        close_files()
\ No newline at end of file
@@ -1,16 +1,22 @@
-from pydantic import BaseModel
+from functools import cached_property
 
+from models.cached_key import CachedKeyModel
 from models.input_source import InputSource
 
 
-class Asset(BaseModel):
+class Asset(CachedKeyModel):
     ticker: str  # Internal name
     identifier: str  # Source identifier for the ticker
     source: InputSource
     strategy_alias: str = ""  # Alias for strategy # Ej:subyacente
 
-    def __str__(self):
+    @cached_property
+    def key(self) -> str:
+        # Built once, str() and hash() are called on every store lookup
         return "#".join([self.source.__class__.__name__, self.ticker])
 
+    def __str__(self):
+        return self.key
+
     def __hash__(self):
-        return self.__str__().__hash__()
+        return self.key.__hash__()
@@ -0,0 +1,159 @@
+import math
+import time
+from typing import List, Dict, Any, Iterator, Sequence, Optional
+
+import numpy as np
+import pandas as pd
+
+from models.online.agent import Agent
+from models.online.bar_builder import BarBuilder, NS
+from models.online.data_store import DataStore
+from models.online.input_store import InputStore
+from models.output_source import SimulatedOutputSource
+from models.strategies.strategy import Strategy
+from models.tick import Tick, TICK_COLUMNS, LAST_PRICE, VOLUME
+
+# Columns of the recorded OPERATIONS data
+TIME_COLUMN = 'fecha'
+PRICE_COLUMN = 'precio'
+VOLUME_COLUMN = 'cantidad'
+
+
+class SimulatedClock:
+    # Time of the last replayed tick, in ns
+
+    def __init__(self):
+        self.now = 0
+
+    def advance(self, now: int) -> None:
+        if now < self.now:
+            raise Exception(f"Time can not go backwards in {self.__class__.__name__}")
+        self.now = now
+
+
+class InlinePool:
+    # Runs DataStore tasks in the calling process, in order
+
+    @staticmethod
+    def starmap(function, params) -> List[Any]:
+        return [function(*p) for p in params]
+
+
+def merge_operations(
+        operations: Dict[str, pd.DataFrame],
+        time_column: str = TIME_COLUMN,
+        price_column: str = PRICE_COLUMN,
+        volume_column: str = VOLUME_COLUMN
+) -> pd.DataFrame:
+    """
+    Merges the recorded operations of every ticker (<source_name>#<ticker> -> operations) into one tick stream
+    sorted by time. Returns columns: time (ns), source_ticker, last_price, volume.
+    """
+    frames = []
+    for source_ticker, df in operations.items():
+        frames.append(pd.DataFrame({
+            'time': pd.to_datetime(df[time_column]).values.astype('datetime64[ns]').astype(np.int64),
+            'source_ticker': source_ticker,
+            'last_price': df[price_column].to_numpy(dtype=np.float64),
+            'volume': df[volume_column].to_numpy(dtype=np.float64)
+        }))
+
+    # Stable sort keeps the recorded order of operations with the same time
+    return pd.concat(frames, ignore_index=True).sort_values('time', kind='stable', ignore_index=True)
+
+
+class Backtest:
+    """
+    Replays recorded ticks through the live stack: InputStore buffers, BarBuilder, DataStore indicators and
+    Agent strategy evaluation, without processes or schedules. Time is the time of the replayed ticks
+    and orders are filled by a SimulatedOutputSource.
+    Gaps between ticks longer than session_gap seconds (ej: overnight) are skipped without the empty bars in them.
+    """
+
+    def __init__(self, strategies: List[Strategy], ticks_capacity: int = 10000, bars_capacity: int = 5000,
+                 session_gap: Optional[float] = 3600):
+        self.strategies = strategies
+        self.session_gap_ns = None if session_gap is None else int(session_gap * NS)
+        self.clock = SimulatedClock()
+
+        for strategy in strategies:
+            strategy.config.portfolio.output = SimulatedOutputSource()
+
+        indicators = Strategy.get_indicators_from_strategies(strategies)
+        self.bar_builder = BarBuilder(indicators=indicators, capacity=bars_capacity)
+        self.input_store = InputStore(
+            assets=Strategy.get_assets_from_strategies(strategies),
+            input_notification_queue=None,
+            capacity=ticks_capacity,
+            bar_builder=self.bar_builder,
+            start=False
+        )
+        self.data_store = DataStore(
+            indicators=indicators,
+            input_store=self.input_store.store,
+            data_store={},
+            bar_builder=self.bar_builder,
+            start=False
+        )
+        self.agent = Agent(strategies=strategies, input_store=self.input_store, data_store=self.data_store)
+
+    @staticmethod
+    def iterate_ticks(times: np.ndarray, source_tickers: Sequence[str], prices: np.ndarray,
+                      volumes: np.ndarray) -> Iterator[Tick]:
+        values = [math.nan] * len(TICK_COLUMNS)
+        for tick_time, source_ticker, price, volume in zip(times, source_tickers, prices, volumes):
+            tick_values = values.copy()
+            tick_values[LAST_PRICE], tick_values[VOLUME] = float(price), float(volume)
+            yield Tick(source_ticker, int(tick_time), tick_values)
+
+    def process_tick(self, tick: Tick) -> None:
+        gap = tick.time - self.clock.now if self.clock.now > 0 else 0
+        self.clock.advance(tick.time)
+        for strategy in self.strategies:
+            strategy.config.portfolio.output.now = tick.time
+
+        if self.session_gap_ns is not None and gap > self.session_gap_ns:
+            closed = self.bar_builder.skip_gap(tick.time)
+        else:
+            closed = self.bar_builder.close_due(tick.time)
+        # Bars closed before this tick get their indicators first, once per timeframe, as the scheduler would
+        for timeframe in dict.fromkeys(closed):
+            self.data_store.new_timeframed_execution(timeframe, pool=InlinePool(), data_store=self.data_store.data_store)
+
+        self.input_store.add_to_store(tick)
+
+        for strategy in self.agent.input_strategies_map.get(tick.source_ticker, []):
+            self.agent.process_strategy_by_ticker(strategy, tick.source_ticker)
+
+    def run(self, ticks: pd.DataFrame) -> Dict[str, Any]:
+        """
+        ticks: merged stream, see merge_operations()
+        """
+        return self.run_arrays(
+            ticks['time'].to_numpy(), ticks['source_ticker'].to_numpy(),
+            ticks['last_price'].to_numpy(), ticks['volume'].to_numpy()
+        )
+
+    def run_arrays(self, times: np.ndarray, source_tickers: Sequence[str], prices: np.ndarray,
+                   volumes: np.ndarray) -> Dict[str, Any]:
+        start = time.perf_counter()
+        for tick in self.iterate_ticks(times, source_tickers, prices, volumes):
+            self.process_tick(tick)
+        elapsed = time.perf_counter() - start
+
+        return {
+            'ticks': len(times),
+            'seconds': elapsed,
+            'ticks_per_second': len(times) / elapsed if elapsed > 0 else math.inf,
+            'fills': [len(strategy.config.portfolio.output.fills) for strategy in self.strategies],
+            'liquid': [strategy.config.portfolio.liquid for strategy in self.strategies]
+        }
+
+    def close(self) -> None:
+        # Releases the shared memory of the replay
+        for buffer in list(self.input_store.store.values()) + list(self.bar_builder.bars.values()) + list(
+                self.data_store.timeframed_indicators_store.values()):
+            buffer.unlink()
+        if self.data_store.scheduler is not None:
+            for buffer in self.data_store.scheduler.executions.values():
+                buffer.unlink()
@@ -0,0 +1,148 @@
+import itertools
+import json
+import os
+from multiprocessing import Pool
+from typing import List, Dict, Any, Callable, Tuple, Optional
+
+import numpy as np
+import pandas as pd
+
+from models.backtest.engine import Backtest
+from models.strategies.strategy import Strategy
+
+# Tick data of the pool worker, memory mapped once by the initializer
+_ticks: Dict[str, Any] = {}
+_strategies_factory: Optional[Callable[[Dict[str, Any]], List[Strategy]]] = None
+
+
+def get_job_id(params: Dict[str, Any]) -> str:
+    # Same format as IndicatorConfiguration.__str__, stable across runs so finished jobs can be skipped
+    return '#'.join([f'{k}={v}' for k, v in sorted(params.items())])
+
+
+def expand_grid(grid: Dict[str, List[Any]]) -> List[Dict[str, Any]]:
+    keys = list(grid.keys())
+    return [dict(zip(keys, values)) for values in itertools.product(*[grid[k] for k in keys])]
+
+
+def save_ticks(ticks: pd.DataFrame, path: str) -> None:
+    """
+    Saves a merged tick stream (see merge_operations()) as .npy columns that workers can memory map.
+    """
+    os.makedirs(path, exist_ok=True)
+    codes, source_tickers = pd.factorize(ticks['source_ticker'])
+
+    np.save(os.path.join(path, 'time.npy'), ticks['time'].to_numpy(dtype=np.int64))
+    np.save(os.path.join(path, 'ticker.npy'), codes.astype(np.int32))
+    np.save(os.path.join(path, 'last_price.npy'), ticks['last_price'].to_numpy(dtype=np.float64))
+    np.save(os.path.join(path, 'volume.npy'), ticks['volume'].to_numpy(dtype=np.float64))
+    with open(os.path.join(path, 'tickers.json'), 'w') as file:
+        json.dump(list(source_tickers), file)
+
+
+def load_ticks(path: str) -> Dict[str, Any]:
+    with open(os.path.join(path, 'tickers.json')) as file:
+        source_tickers = json.load(file)
+
+    # Pages are shared between workers through the page cache instead of being copied into every process
+    return {
+        'time': np.load(os.path.join(path, 'time.npy'), mmap_mode='r'),
+        'ticker': np.load(os.path.join(path, 'ticker.npy'), mmap_mode='r'),
+        'last_price': np.load(os.path.join(path, 'last_price.npy'), mmap_mode='r'),
+        'volume': np.load(os.path.join(path, 'volume.npy'), mmap_mode='r'),
+        'source_tickers': source_tickers
+    }
+
+
+def initialize_worker(ticks_path: str, strategies_factory: Callable[[Dict[str, Any]], List[Strategy]]) -> None:
+    global _ticks, _strategies_factory
+    _ticks = load_ticks(ticks_path)
+    _strategies_factory = strategies_factory
+
+
+def get_last_prices(ticks: Dict[str, Any]) -> Dict[str, float]:
+    # <source_name>#<ticker> -> last recorded price
+    codes = np.asarray(ticks['ticker'])
+    found, positions = np.unique(codes[::-1], return_index=True)
+    return {
+        ticks['source_tickers'][code]: float(ticks['last_price'][len(codes) - 1 - position])
+        for code, position in zip(found, positions)
+    }
+
+
+def get_metrics(strategies: List[Strategy], initial_liquids: List[float], last_prices: Dict[str, float]) -> Dict[str, Any]:
+    # PnL marks the open operations to the last recorded price of their asset
+    pnl = 0.0
+    open_operations = 0
+    for strategy, initial_liquid in zip(strategies, initial_liquids):
+        portfolio = strategy.config.portfolio
+        prices = {
+            asset.identifier: last_prices.get(str(asset), np.nan)
+            for asset in Strategy.get_assets_from_strategies([strategy])
+        }
+        marked = sum([operation.quantity * prices.get(operation.identifier, np.nan)
+                      for operation in portfolio.open_operations])
+        pnl += portfolio.liquid + marked - initial_liquid
+        open_operations += len(portfolio.open_operations)
+
+    return {'pnl': pnl, 'open_operations': open_operations}
+
+
+def run_job(job_id: str, params: Dict[str, Any]) -> Dict[str, Any]:
+    strategies = _strategies_factory(params)
+    initial_liquids = [strategy.config.portfolio.liquid for strategy in strategies]
+
+    backtest = Backtest(strategies)
+    try:
+        source_tickers = _ticks['source_tickers']
+        stats = backtest.run_arrays(
+            _ticks['time'], [source_tickers[code] for code in _ticks['ticker']], _ticks['last_price'], _ticks['volume']
+        )
+    finally:
+        backtest.close()
+
+    return {
+        'job_id': job_id,
+        **params,
+        **get_metrics(strategies, initial_liquids, get_last_prices(_ticks)),
+        'fills': sum(stats['fills']),
+        'ticks_per_second': stats['ticks_per_second'],
+        'seconds': stats['seconds']
+    }
+
+
+def run_job_params(job: Tuple[str, Dict[str, Any]]) -> Dict[str, Any]:
+    return run_job(*job)
+
+
+def run_sweep(
+        strategies_factory: Callable[[Dict[str, Any]], List[Strategy]],
+        grid: Dict[str, List[Any]],
+        ticks_path: str,
+        results_path: str,
+        workers: int = max(1, os.cpu_count() - 2)
+) -> pd.DataFrame:
+    """
+    Backtests every combination of the grid (parameter -> values) across a process pool.
+
+    strategies_factory: builds the strategies of one combination, must be picklable (module level function)
+    ticks_path: directory written by save_ticks(), memory mapped once per worker
+    results_path: CSV with one row per combination, appended as jobs finish. Combinations already present
+                  are skipped, so an interrupted sweep resumes where it stopped.
+    """
+    done = set()
+    if os.path.isfile(results_path):
+        done = set(pd.read_csv(results_path, usecols=['job_id'])['job_id'])
+
+    jobs = [(get_job_id(params), params) for params in expand_grid(grid)]
+    jobs = [job for job in jobs if job[0] not in done]
+    print(f'Sweep: {len(jobs)} jobs pending, {len(done)} already done')
+
+    with Pool(processes=workers, initializer=initialize_worker, initargs=(ticks_path, strategies_factory)) as pool:
+        for result in pool.imap_unordered(run_job_params, jobs):
+            pd.DataFrame([result]).to_csv(
+                results_path, mode='a', header=not os.path.isfile(results_path), index=False
+            )
+            print(f"Sweep job {result['job_id']} done - pnl: {result['pnl']:.2f}")
+
+    return pd.read_csv(results_path)
@@ -0,0 +1,20 @@
+from typing import Any, Dict, Optional
+
+from pydantic import BaseModel
+
+
+class CachedKeyModel(BaseModel):
+    """
+    Model with a key cached_property built from its fields. The cached key is dropped whenever a field changes,
+    so it is rebuilt with the new values.
+    """
+
+    def __setattr__(self, name: str, value: Any) -> None:
+        super().__setattr__(name, value)
+        self.__dict__.pop('key', None)
+
+    def model_copy(self, *, update: Optional[Dict[str, Any]] = None, deep: bool = False):
+        # Updated copies do not go through __setattr__
+        copy = super().model_copy(update=update, deep=deep)
+        copy.__dict__.pop('key', None)
+        return copy
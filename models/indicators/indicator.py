@@ -1,22 +1,41 @@
 from abc import ABC, abstractmethod
-from typing import List
+from functools import cached_property
+from typing import List, Dict, Optional
 
+import numpy as np
 import pandas as pd
 from pydantic import BaseModel, model_validator
 
 from models.asset import Asset
+from models.cached_key import CachedKeyModel
 
 
-class IndicatorConfiguration(BaseModel, ABC):
+class IndicatorConfiguration(CachedKeyModel, ABC):
     timeframe: str  # In seconds
     min_length: int
 
-    def __str__(self):
+    @cached_property
+    def key(self) -> str:
+        # Built once instead of running model_dump() on every str()
         properties = [f'{k}={v}' for k, v in self.model_dump().items()]
         properties = '#'.join(properties)
 
         return properties
 
+    def __str__(self):
+        return self.key
+
+
+class IndicatorStream(ABC):
+    """
+    Incremental computation of an indicator for one (asset, config). Receives every closed bar once, in order.
+    """
+    columns: List[str]  # Output columns, same as the ones returned by compute()
+
+    @abstractmethod
+    def update(self, bar: Dict[str, float]) -> Dict[str, float]:
+        raise Exception(f"Method update() must be implemented for {self.__class__.__name__}")
+
 
 class Indicator(BaseModel, ABC):
     config: List[IndicatorConfiguration]
@@ -31,8 +50,6 @@ class Indicator(BaseModel, ABC):
         assets_ids = [str(asset) for asset in self.assets]
         timeframes = [config.timeframe for config in self.config]
 
-        # hay que asumir que los timeframes sean divisibles entre si por el time.sleep(min())
-
         for timeframe in timeframes:
             if int(timeframe) < 5:
                 raise Exception(f"Timeframe must be greater or equal than 5 in indicator {self.__class__.__name__}")
@@ -45,3 +62,23 @@ class Indicator(BaseModel, ABC):
     @abstractmethod
     def compute(self, df: pd.DataFrame, config: IndicatorConfiguration) -> pd.DataFrame:
         raise Exception(f"Method compute() must be implemented for {self.__class__.__name__}")
+
+    def stream(self, config: IndicatorConfiguration) -> Optional[IndicatorStream]:
+        # Indicators that can be updated bar by bar return a new stream, None means compute() is used
+        return None
+
+    def columns(self, config: IndicatorConfiguration) -> Optional[List[str]]:
+        # Output columns of compute_batch(), one value per column
+        return None
+
+    def compute_batch(self, bars: Dict[str, np.ndarray], configs: List[IndicatorConfiguration]) -> Optional[np.ndarray]:
+        """
+        Vectorized computation of every config for many assets at once.
+
+        bars: bar column -> array (assets x bars), oldest bar first and NaN padded on the left
+        Returns the last value of every output column: array (configs x assets x columns), None if not supported.
+        """
+        return None
+
+    def has_batch(self) -> bool:
+        return type(self).compute_batch is not Indicator.compute_batch
@@ -1,15 +1,27 @@
-from typing import List
+from typing import List, Dict
 
+import numpy as np
 import pandas as pd
 
 from models.asset import Asset
-from models.indicators.indicator import Indicator, IndicatorConfiguration
+from models.indicators.indicator import Indicator, IndicatorConfiguration, IndicatorStream
+from models.indicators.streaming import StreamingSMA
 
 
 class VeryPowerfulIndicatorConfiguration(IndicatorConfiguration):
     sma_length: int
 
 
+class VeryPowerfulIndicatorStream(IndicatorStream):
+
+    def __init__(self, config: VeryPowerfulIndicatorConfiguration):
+        self.columns = [f'SMA_{config.sma_length}']
+        self.sma = StreamingSMA(config.sma_length)
+
+    def update(self, bar: Dict[str, float]) -> Dict[str, float]:
+        return {self.columns[0]: self.sma.update(bar['Close'])}
+
+
 class VeryPowerfulIndicator(Indicator):
 
     def __init__(self, assets: List[Asset], config: List[VeryPowerfulIndicatorConfiguration]):
@@ -22,3 +34,23 @@ class VeryPowerfulIndicator(Indicator):
             .iloc[-1:]
         ).rename(columns={'Close': f'SMA_{config.sma_length}'})
         # Habria que testear que este identificador no se repita
+
+    def stream(self, config: VeryPowerfulIndicatorConfiguration) -> VeryPowerfulIndicatorStream:
+        return VeryPowerfulIndicatorStream(config)
+
+    def columns(self, config: VeryPowerfulIndicatorConfiguration) -> List[str]:
+        return [f'SMA_{config.sma_length}']
+
+    def compute_batch(self, bars: Dict[str, np.ndarray], configs: List[VeryPowerfulIndicatorConfiguration]) -> np.ndarray:
+        lengths = np.array([config.sma_length for config in configs])
+        min_lengths = np.array([config.min_length for config in configs])
+
+        # Sums of the last k closes for every k, NaN only if the window reaches the padding
+        sums = np.cumsum(bars['Close'][:, ::-1], axis=1)
+        sums = sums[:, np.minimum(lengths, sums.shape[1]) - 1].T  # configs x assets
+        values = sums / lengths[:, None]
+
+        # Same as compute(), which only sees the last min_length bars
+        values[(lengths > min_lengths) | (lengths > bars['Close'].shape[1])] = np.nan
+
+        return values[:, :, None]
\ No newline at end of file
@@ -0,0 +1,79 @@
+import math
+from collections import deque
+
+
+class StreamingSMA:
+    """ Simple moving average, NaN until length values are received. O(1) per update. """
+
+    def __init__(self, length: int):
+        self.length = length
+        self.window = deque(maxlen=length)
+        self.total = 0.0
+
+    def update(self, value: float) -> float:
+        if len(self.window) == self.length:
+            self.total -= self.window[0]
+        self.window.append(value)
+        self.total += value
+
+        if len(self.window) < self.length:
+            return math.nan
+        return self.total / self.length
+
+
+class StreamingEMA:
+    """ Exponential moving average with alpha = 2 / (length + 1), same as pandas ewm(span=length, adjust=False). """
+
+    def __init__(self, length: int):
+        self.alpha = 2 / (length + 1)
+        self.value = math.nan
+
+    def update(self, value: float) -> float:
+        if math.isnan(self.value):
+            self.value = value
+        else:
+            self.value += self.alpha * (value - self.value)
+        return self.value
+
+
+class StreamingStd:
+    """
+    Rolling sample standard deviation (ddof=1, like pandas rolling().std()). O(1) per update.
+    Welford style mean and sum of squared deviations, updated when a value enters and leaves the window, so
+    it keeps its precision at any price level. Both are recomputed from the window every length updates to
+    discard the accumulated rounding.
+    """
+
+    def __init__(self, length: int):
+        if length < 2:
+            raise Exception(f"Length must be greater than 1 in {self.__class__.__name__}")
+        self.length = length
+        self.window = deque(maxlen=length)
+        self.mean = 0.0
+        self.m2 = 0.0  # Sum of squared deviations from the mean
+        self.updates = 0
+
+    def update(self, value: float) -> float:
+        if len(self.window) == self.length:
+            old = self.window[0]
+            self.window.append(value)
+            delta = value - old
+            mean = self.mean + delta / self.length
+            self.m2 += delta * (value - mean + old - self.mean)
+            self.mean = mean
+        else:
+            self.window.append(value)
+            delta = value - self.mean
+            self.mean += delta / len(self.window)
+            self.m2 += delta * (value - self.mean)
+
+        self.updates += 1
+        if self.updates % self.length == 0:
+            self.mean = math.fsum(self.window) / len(self.window)
+            self.m2 = math.fsum((x - self.mean) ** 2 for x in self.window)
+
+        if len(self.window) < self.length:
+            return math.nan
+
+        # Rounding can leave tiny negative values on flat windows
+        return math.sqrt(max(self.m2 / (self.length - 1), 0.0))
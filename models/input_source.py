@@ -1,13 +1,25 @@
+import asyncio
 import json
 import os
+import random
 from abc import ABC, abstractmethod
 from datetime import datetime
 from multiprocessing import Queue
-from typing import List, Any, Dict, Tuple
+from typing import List
 
-import pandas as pd
+import websockets
 from pydantic import BaseModel
-from websockets.sync.client import connect
+
+from models.tick import Tick, now_ns
+
+
+# Balanz message keys in TICK_COLUMNS order: last price, volume and the 7 box levels (buy price/quantity, then sell)
+BALANZ_TICK_FIELDS = ['u', 'v'] + [
+    f'{field}{side}{"" if level == 0 else level}'
+    for side in ['c', 'v']
+    for level in range(7)
+    for field in ['p', 'c']
+]
 
 
 class InputSource(BaseModel, ABC):
@@ -18,95 +30,76 @@ class WebsocketInputSource(InputSource, ABC):
 
     @abstractmethod
     def start(self, queue: Queue, tickers: List[str]) -> None:
+        # Puts batches (lists) of Ticks on the queue
         raise Exception(f"Method start() must be implemented for {self.__class__.__name__}")
 
 
 class BalanzWebsocketInputSource(WebsocketInputSource):
     url: str = "wss://clientes.balanz.com/websocket"
+    connections: int = 1  # Subscribed identifiers are sharded between this many connections
+    batch_size: int = 100  # Max messages per queue put
+    batch_interval: float = 0.05  # Max seconds a message waits for its batch
+    reconnect_min_delay: float = 0.5
+    reconnect_max_delay: float = 30
 
     @staticmethod
-    def preprocess_message(message: str) -> Tuple[str, pd.DataFrame]:
-
+    def preprocess_message(message: str) -> Tick:
         message = json.loads(message)
+        return Tick.from_fields(
+            f"{BalanzWebsocketInputSource.__name__}#{message['ticker']}", now_ns(), message, BALANZ_TICK_FIELDS
+        )
 
-        df = pd.DataFrame([{
-            'time': datetime.now(),
-
-            'last_price': message.get('u', None),
-            'volume': message.get('v', None),
-
-            'box_buy_price_1': message.get('pc', None),
-            'box_buy_quantity_1': message.get('cc', None),
-            'box_buy_price_2': message.get('pc1', None),
-            'box_buy_quantity_2': message.get('cc1', None),
-            'box_buy_price_3': message.get('pc2', None),
-            'box_buy_quantity_3': message.get('cc2', None),
-            'box_buy_price_4': message.get('pc3', None),
-            'box_buy_quantity_4': message.get('cc3', None),
-            'box_buy_price_5': message.get('pc4', None),
-            'box_buy_quantity_5': message.get('cc4', None),
-            'box_buy_price_6': message.get('pc5', None),
-            'box_buy_quantity_6': message.get('cc5', None),
-            'box_buy_price_7': message.get('pc6', None),
-            'box_buy_quantity_7': message.get('cc6', None),
-
-            'box_sell_price_1': message.get('pv', None),
-            'box_sell_quantity_1': message.get('cv', None),
-            'box_sell_price_2': message.get('pv1', None),
-            'box_sell_quantity_2': message.get('cv1', None),
-            'box_sell_price_3': message.get('pv2', None),
-            'box_sell_quantity_3': message.get('cv2', None),
-            'box_sell_price_4': message.get('pv3', None),
-            'box_sell_quantity_4': message.get('cv3', None),
-            'box_sell_price_5': message.get('pv4', None),
-            'box_sell_quantity_5': message.get('cv4', None),
-            'box_sell_price_6': message.get('pv5', None),
-            'box_sell_quantity_6': message.get('cv5', None),
-            'box_sell_price_7': message.get('pv6', None),
-            'box_sell_quantity_7': message.get('cv6', None)
-        }])
-
-        df.set_index('time', inplace=True)
-
-        return f"{BalanzWebsocketInputSource.__name__}#{message['ticker']}", df
+    def subscription(self, identifier: str) -> str:
+        return '{{"securities": "{ticker}","token": "{token}"}}'.format(ticker=identifier, token=os.environ["TOKEN"])
 
     def start(self, queue: Queue, identifiers: List[str]) -> None:
-        with connect(self.url) as websocket:
-            print(f'Starting connection {self.url}')
+        asyncio.run(self.run(queue, identifiers))
 
-            for identifier in identifiers:
-                print(f'Sending ticker request {self.__class__.__name__} - {identifier}')
-                websocket.send(
-                    '{{"securities": "{ticker}","token": "{token}"}}'.format(ticker=identifier, token=os.environ["TOKEN"])
-                )
-
-            while True:
-                message = websocket.recv()
-                queue.put(BalanzWebsocketInputSource.preprocess_message(message))
+    async def run(self, queue: Queue, identifiers: List[str]) -> None:
+        # Identifiers are spread round robin between the connections
+        shards = [identifiers[i::self.connections] for i in range(self.connections)]
+        batch = []
 
+        def flush() -> None:
+            if len(batch) > 0:
+                queue.put(batch.copy())
+                batch.clear()
 
-"""
+        async def flush_periodically() -> None:
+            while True:
+                await asyncio.sleep(self.batch_interval)
+                flush()
 
-import websockets
-# drive the client connection
-async def main():
-    # open a connection to the server
-    async with websockets.connect("wss://clientes.balanz.com/websocket") as websocket:
-        # report progress
-        print('Connected to server')
-        # send a message to server
-        print(await websocket.send('{"securities": "GFGC40608J", "token": "<>"}'))
-        print(await websocket.send('{"securities": "GFGC44608J", "token": "<>"}'))
-        
-        while True:
-            # read message from server
-            message = await websocket.recv()
-            # report result
-            print(f"Received: {message}")
-    # report progress
-    print('Disconnected')
-# start the event loop
-asyncio.run(main())
-
-
-"""
+        async def listen(shard: List[str]) -> None:
+            delay = self.reconnect_min_delay
+            while True:
+                try:
+                    async with websockets.connect(self.url) as websocket:
+                        print(f'Starting connection {self.url} with {len(shard)} tickers')
+                        for identifier in shard:
+                            print(f'Sending ticker request {self.__class__.__name__} - {identifier}')
+                            await websocket.send(self.subscription(identifier))
+                        delay = self.reconnect_min_delay
+
+                        async for message in websocket:
+                            try:
+                                tick = self.preprocess_message(message)
+                            except (ValueError, KeyError, TypeError) as e:
+                                # Not a ticker message or malformed (json.JSONDecodeError is a ValueError)
+                                print(f'{str(datetime.now())} - Skipping message {str(message)[:200]}: {repr(e)}')
+                                continue
+                            batch.append(tick)
+                            if len(batch) >= self.batch_size:
+                                flush()
+                except (websockets.ConnectionClosed, websockets.InvalidHandshake, OSError, asyncio.TimeoutError) as e:
+                    print(f'{str(datetime.now())} - Connection {self.url} lost: {str(e)}')
+                except Exception as e:
+                    # Any other failure only restarts this shard's connection, the other shards keep listening
+                    print(f'{str(datetime.now())} - Connection {self.url} failed: {repr(e)}')
+
+                # Exponential backoff with jitter, the subscriptions are sent again after reconnecting
+                print(f'Reconnecting to {self.url} in {delay:.1f}s')
+                await asyncio.sleep(delay * random.uniform(0.5, 1))
+                delay = min(delay * 2, self.reconnect_max_delay)
+
+        await asyncio.gather(flush_periodically(), *[listen(shard) for shard in shards if len(shard) > 0])
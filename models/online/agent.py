@@ -1,10 +1,10 @@
-import multiprocessing
-from typing import List, Any, Dict
-
-import pandas as pd
+from typing import List, Any, Dict, Tuple, Optional
 
 from models.online.data_store import DataStore
+from models.online.dispatcher import Dispatcher
+from models.online.evaluation_plan import EvaluationPlan
 from models.online.input_store import InputStore
+from models.options.risk import PortfolioRisk
 from models.strategies.strategy import Strategy
 
 
@@ -14,93 +14,50 @@ class Agent:
             self,
             strategies: List[Strategy],
             input_store: InputStore,
-            data_store: DataStore
+            data_store: DataStore,
+            ticks_window: int = 5,  # Ticks per asset given to the strategies
+            bars_window: int = 100,  # Bars and indicator values per asset and timeframe given to evaluate_arrays()
+            materialize_frames: bool = False,  # True to give DataFrames to every strategy, even the array based ones
+            workers: int = 1  # Processes evaluating the strategies, each strategy is pinned to one of them
     ) -> None:
         self.strategies = strategies
         self.input_store = input_store
         self.data_store = data_store
+        self.ticks_window = ticks_window
+        self.bars_window = bars_window
+        self.materialize_frames = materialize_frames
+        self.workers = workers
 
         # Hash between InputStore queue and strategies
         self.input_strategies_map = self.get_input_strategies_map(strategies)
+        # Inputs of every strategy evaluation, compiled once
+        self.evaluation_plans = self.compile_evaluation_plans(strategies)
 
-    def start(self):
-        # The listener process will be listening to the input queue and will trigger the strategies
-        listen_to_input_queue_process = multiprocessing.Process(
-            target=Agent.listen_to_input_queue,
-            args=(self,)
-        )
-        listen_to_input_queue_process.start()
-
-    def listen_to_input_queue(self) -> Any:
-        while True:
-            # Ticker that triggers strategy evaluation
-            activaction_ticker = self.input_store.input_notification_queue.get()
-
-            for strategy in self.input_strategies_map[activaction_ticker]:
-                self.process_strategy_by_ticker(strategy, activaction_ticker)
+    def start(self) -> Dispatcher:
+        # The dispatcher listens to the input queue and triggers the strategies in the worker processes
+        dispatcher = Dispatcher(self, workers=self.workers)
+        dispatcher.start()
+        return dispatcher
 
     def process_strategy_by_ticker(self, strategy: Strategy, activation_ticker: str) -> None:
-        asset_id = f'ASSET#{activation_ticker}'
-        real_time_assets = self.input_store.store[asset_id].iloc[-1]
-
-        real_time_assets = pd.DataFrame([])
-        timeframed_indicators = pd.DataFrame([])
-        timeframed_assets = pd.DataFrame([])
-        timeframed_assets_definition_map = {} # timeframe -> List[ticker]
-        for i in strategy.config.indicators:
-            combinations = [
-                (i_config, asset)
-                for i_config in i.config
-                for asset in i.assets
-            ]
-            for i_config, asset in combinations:
-                asset_id = f'ASSET#{str(asset)}'
-                timeframed_asset_id = f'{i_config.timeframe}_{asset_id}'
-                indicator_id = f'{i_config.timeframe}_INDICATOR#{activation_ticker}#{i.__class__.__name__}#{str(i_config)}'
-
-                if (indicator_id not in self.data_store.data_store.keys()
-                        or timeframed_asset_id not in self.data_store.data_store.keys()
-                        or asset_id not in self.input_store.store.keys()
-                ):
-                    print(f'Skipping {strategy.__class__.__name__} evaluation for ticker {activation_ticker}')
-                    return None
-
-                real_time_asset_prefix = asset.strategy_alias if asset.strategy_alias != "" else asset.ticker
-                timeframed_prefix = f'{i_config.timeframe}#{real_time_asset_prefix}'
-
-                if i_config.timeframe not in timeframed_assets_definition_map.keys():
-                    timeframed_assets_definition_map[i_config.timeframe] = []
-                if real_time_asset_prefix not in timeframed_assets_definition_map[i_config.timeframe]:
-                    timeframed_assets_definition_map[i_config.timeframe].append(real_time_asset_prefix)
-
-                if len(real_time_assets) == 0 or not real_time_assets.columns.str.startswith(real_time_asset_prefix).any():
-
-                    real_time_assets = pd.concat([
-                        real_time_assets,
-                        self.input_store.store[asset_id].iloc[-5:].add_prefix(f'{real_time_asset_prefix}#')
-                    ], axis=1)
-
-                if len(timeframed_assets) == 0 or not timeframed_assets.columns.str.startswith(
-                        timeframed_prefix).any():
-                    timeframed_assets = pd.concat([
-                        timeframed_assets,
-                        self.data_store.data_store[timeframed_asset_id].add_prefix(f'{timeframed_prefix}#')
-                    ], axis=1)
-
-                timeframed_indicators = pd.concat([
-                    timeframed_indicators,
-                    self.data_store.data_store[indicator_id].add_prefix(f'{timeframed_prefix}#')
-                ], axis=1)
-
-        # If differences -> not up to date
-        # if not (real_time_assets.index == self.input_store.store[asset_id].iloc[-1].index).all():
-        #     print('Returning')
-        #     print(real_time_assets.index)
-        #     print(self.input_store.store[asset_id].iloc[-1].index)
-        #     print('\n\n\n')
-        #     return None
-
-        strategy.evaluate(real_time_assets, timeframed_indicators, timeframed_assets, timeframed_assets_definition_map)
+        plan = self.get_evaluation_plan(strategy, activation_ticker)
+
+        if not plan.is_ready():
+            print(f'Skipping {strategy.__class__.__name__} evaluation for ticker {activation_ticker}')
+            return None
+
+        # Fills of the asynchronous orders are booked before the strategy reads its portfolio
+        strategy.config.portfolio.process_order_updates()
+        # Snapshot of the volatility surface and portfolio risk, read by both evaluation modes
+        plan.sync_surface()
+        strategy._surface_snapshot = plan.surface_snapshot
+        strategy._portfolio_risk = plan.portfolio_risk
+        if strategy.has_arrays() and not self.materialize_frames:
+            # Ticks, bars and indicators copied from shared memory into the preallocated slots of the plan
+            plan.fill()
+            strategy.evaluate_arrays(plan)
+        else:
+            strategy.evaluate(*plan.to_frames())
 
     def get_input_strategies_map(self, strategies: List[Strategy]) -> Dict[str, Any]:
         input_strategies_map = {}
@@ -120,3 +77,38 @@ class Agent:
             input_strategies_map[asset_str].append(strategy)
 
         return input_strategies_map
+
+    def compile_evaluation_plans(self, strategies: List[Strategy]) -> Dict[str, List[Tuple[Strategy, EvaluationPlan]]]:
+        # Activation ticker -> (strategy, plan) for every strategy it triggers
+        evaluation_plans = {}
+        # One risk view per strategy trading the surface chain, updated by every plan of the strategy
+        risks = {id(strategy): self.get_portfolio_risk(strategy) for strategy in strategies}
+
+        for activation_ticker, activated_strategies in self.input_strategies_map.items():
+            for strategy in activated_strategies:
+                if any(s is strategy for s, _ in evaluation_plans.get(activation_ticker, [])):
+                    continue
+                evaluation_plans.setdefault(activation_ticker, []).append((strategy, EvaluationPlan(
+                    strategy, activation_ticker, self.data_store, self.input_store.store,
+                    ticks_window=self.ticks_window, bars_window=self.bars_window, surface=self.input_store.surface,
+                    risk=risks[id(strategy)]
+                )))
+
+        return evaluation_plans
+
+    def get_portfolio_risk(self, strategy: Strategy) -> Optional[PortfolioRisk]:
+        surface = self.input_store.surface
+        if surface is None:
+            return None
+
+        assets = Strategy.get_assets_from_strategies([strategy])
+        if not any(asset.ticker in surface.chain.tickers or asset.identifier == surface.underlying.identifier
+                   for asset in assets):
+            return None
+        return PortfolioRisk(surface, surface.underlying, assets)
+
+    def get_evaluation_plan(self, strategy: Strategy, activation_ticker: str) -> EvaluationPlan:
+        for evaluated_strategy, plan in self.evaluation_plans[activation_ticker]:
+            if evaluated_strategy is strategy:
+                return plan
+        raise Exception(f"{strategy.__class__.__name__} is not activated by {activation_ticker}")
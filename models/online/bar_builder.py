@@ -0,0 +1,186 @@
+import math
+from typing import List, Dict, Optional
+
+from models.indicators.indicator import Indicator
+from models.online.metrics import get_metrics
+from models.online.ring_buffer import BarBuffer
+
+NS = 1_000_000_000
+
+# Open bar slots
+OPEN, HIGH, LOW, CLOSE, VOLUME, TICKS = range(6)
+
+
+class BarBuilder:
+    """
+    Streaming OHLCV aggregation per (asset, timeframe). Ticks update the open bar in O(1) and bars are closed on
+    wall-clock boundaries (multiples of the timeframe), repeating the last bar when the timeframe had no ticks.
+
+    Timeframes are rolled up: ticks only update the smallest timeframes of every asset and each larger timeframe
+    aggregates the closed bars of the largest smaller timeframe that divides it (ej: 5 -> 60 -> 300), so the work
+    per tick does not grow with the number of timeframes.
+
+    Closed bars are published to shared BarBuffers, the open bars only live in the process feeding the ticks
+    (the InputStore listener), so it must be the only one calling update() and close_due().
+    """
+
+    def __init__(self, indicators: List[Indicator], capacity: int = 5000):
+        self.timeframed_assets = self.define_timeframed_assets(indicators)
+
+        # STORE IDS: <timeframe>_ASSET#<source.__class__.__name__>#<asset_name>
+        self.bars: Dict[str, BarBuffer] = {
+            f'{timeframe}_{asset_id}': BarBuffer(capacity=capacity)
+            for timeframe, assets_ids in self.timeframed_assets.items()
+            for asset_id in assets_ids
+        }
+
+        # Asset -> timeframe -> open bar
+        self.open_bars: Dict[str, Dict[str, List[float]]] = {}
+        for timeframe, assets_ids in self.timeframed_assets.items():
+            for asset_id in assets_ids:
+                self.open_bars.setdefault(asset_id, {})[timeframe] = self.new_open_bar()
+
+        # Asset -> timeframe -> larger timeframes aggregating its closed bars
+        self.rollups: Dict[str, Dict[str, List[str]]] = {}
+        # Asset -> open bars updated by the ticks
+        self.tick_bars: Dict[str, List[List[float]]] = {}
+        for asset_id, open_bars in self.open_bars.items():
+            parents = self.define_rollup(list(open_bars.keys()))
+            self.rollups[asset_id] = {timeframe: [] for timeframe in open_bars.keys()}
+            self.tick_bars[asset_id] = []
+            for timeframe, parent in parents.items():
+                if parent is None:
+                    self.tick_bars[asset_id].append(open_bars[timeframe])
+                else:
+                    self.rollups[asset_id][parent].append(timeframe)
+
+        self.next_close: Dict[str, int] = {}
+        self.deadline = 0  # Closest next_close
+
+    @staticmethod
+    def define_rollup(timeframes: List[str]) -> Dict[str, Optional[str]]:
+        # Timeframe -> largest smaller timeframe dividing it, None when it must be built from ticks
+        parents = {}
+        for timeframe in timeframes:
+            divisors = [t for t in timeframes if int(t) < int(timeframe) and int(timeframe) % int(t) == 0]
+            parents[timeframe] = max(divisors, key=int) if len(divisors) > 0 else None
+        return parents
+
+    @staticmethod
+    def new_open_bar() -> List[float]:
+        return [math.nan, -math.inf, math.inf, math.nan, 0.0, 0]
+
+    @staticmethod
+    def define_timeframed_assets(indicators: List[Indicator]) -> Dict[str, List[str]]:
+        timeframed_assets = {}
+
+        for indicator in indicators:
+            for indicator_config in indicator.config:
+                for asset in indicator.assets:
+                    asset_id = "#".join(['ASSET', str(asset)])
+                    assets_ids = timeframed_assets.setdefault(indicator_config.timeframe, [])
+                    if asset_id not in assets_ids:
+                        assets_ids.append(asset_id)
+
+        return timeframed_assets
+
+    def next_deadline(self, now: int) -> int:
+        # Closest bar boundary among all timeframes
+        if len(self.next_close) == 0:
+            self.start(now)
+        return self.deadline
+
+    def start(self, now: int) -> None:
+        for timeframe in self.timeframed_assets.keys():
+            tf_ns = int(timeframe) * NS
+            self.next_close[timeframe] = (now // tf_ns + 1) * tf_ns
+        self.deadline = min(self.next_close.values())
+
+    def update(self, asset_id: str, time: int, price: float, volume: float) -> None:
+        self.close_due(time)
+
+        for bar in self.tick_bars.get(asset_id, []):
+            if not math.isnan(volume):
+                bar[VOLUME] += volume
+            if math.isnan(price):
+                continue
+
+            if bar[TICKS] == 0:
+                bar[OPEN] = price
+            bar[HIGH] = max(bar[HIGH], price)
+            bar[LOW] = min(bar[LOW], price)
+            bar[CLOSE] = price
+            bar[TICKS] += 1
+
+    def close_due(self, now: int) -> List[str]:
+        # Returns the timeframes that closed bars
+        if len(self.next_close) == 0:
+            self.start(now)
+
+        closed = []
+        # Every elapsed boundary closes a bar, even when no ticks arrived. In time order and, on the same
+        # boundary, smaller timeframes first so their bars are rolled up before the larger ones close
+        while now >= self.deadline:
+            timeframe, close_time = min(self.next_close.items(), key=lambda item: (item[1], int(item[0])))
+            for asset_id in self.timeframed_assets[timeframe]:
+                self.close_bar(timeframe, asset_id, close_time)
+            self.next_close[timeframe] = close_time + int(timeframe) * NS
+            self.deadline = min(self.next_close.values())
+            closed.append(timeframe)
+            get_metrics().record('bar', now - close_time)
+
+        return closed
+
+    def skip_gap(self, now: int) -> List[str]:
+        """
+        Closes the open bars on their next boundary and moves every timeframe to the first boundary after now,
+        without the empty bars of the boundaries in between (ej: the gap between two sessions). Returns the
+        timeframes that closed bars, once each.
+        """
+        if len(self.next_close) == 0:
+            self.start(now)
+            return []
+
+        closed = []
+        # Same order as close_due(), so smaller timeframes are rolled up before the larger ones close
+        for timeframe, close_time in sorted(self.next_close.items(), key=lambda item: (item[1], int(item[0]))):
+            if close_time > now:
+                continue
+            for asset_id in self.timeframed_assets[timeframe]:
+                self.close_bar(timeframe, asset_id, close_time)
+            closed.append(timeframe)
+
+        for timeframe in closed:
+            tf_ns = int(timeframe) * NS
+            self.next_close[timeframe] = (now // tf_ns + 1) * tf_ns
+        self.deadline = min(self.next_close.values())
+        return closed
+
+    def close_bar(self, timeframe: str, asset_id: str, close_time: int) -> None:
+        bars = self.bars[f'{timeframe}_{asset_id}']
+        bar = self.open_bars[asset_id][timeframe]
+
+        for rollup_timeframe in self.rollups[asset_id][timeframe]:
+            self.merge_bar(self.open_bars[asset_id][rollup_timeframe], bar)
+
+        if bar[TICKS] > 0:
+            bars.append(close_time, bar[OPEN:TICKS])
+        elif len(bars) > 0:
+            # No ticks in the timeframe, repeat the last bar
+            bars.append(close_time, bars.view(1)[1][0].copy())
+
+        bar[:] = self.new_open_bar()
+
+    @staticmethod
+    def merge_bar(bar: List[float], closed_bar: List[float]) -> None:
+        # OHLCV is associative: aggregating closed bars gives the same bar as aggregating their ticks
+        bar[VOLUME] += closed_bar[VOLUME]
+        if closed_bar[TICKS] == 0:
+            return
+
+        if bar[TICKS] == 0:
+            bar[OPEN] = closed_bar[OPEN]
+        bar[HIGH] = max(bar[HIGH], closed_bar[HIGH])
+        bar[LOW] = min(bar[LOW], closed_bar[LOW])
+        bar[CLOSE] = closed_bar[CLOSE]
+        bar[TICKS] += closed_bar[TICKS]
@@ -1,15 +1,17 @@
 import multiprocessing
 import os
 import threading
-import time
-from datetime import datetime, timedelta
-from typing import List, Dict, Any, Tuple
+from typing import List, Dict, Any, Tuple, Optional
 
+import numpy as np
 import pandas as pd
-import schedule
 
-from models.asset import Asset
-from models.indicators.indicator import Indicator, IndicatorConfiguration
+from models.indicators.indicator import Indicator, IndicatorConfiguration, IndicatorStream
+from models.online.bar_builder import BarBuilder
+from models.online.metrics import get_metrics
+from models.online.registry import Registry
+from models.online.ring_buffer import TickBuffer, BarBuffer, IndicatorBuffer, BAR_COLUMNS
+from models.online.scheduler import TimeframeScheduler
 
 
 class DataStore:
@@ -17,8 +19,11 @@ class DataStore:
     def __init__(
             self,
             indicators: List[Indicator],
-            input_store: Dict[str, pd.DataFrame],  # Asset -> Dataframe
-            data_store: Dict[str, pd.DataFrame]  # TF_ASSET OR TF_INDICATOR_CONFIG -> Dataframe
+            input_store: Dict[str, TickBuffer],  # Asset -> Ticks
+            data_store: Dict[str, pd.DataFrame],  # TF_INDICATOR_CONFIG -> Dataframe, for indicators without stream()
+            bar_builder: BarBuilder,  # TF_ASSET -> Bars, built by the InputStore listener
+            indicators_capacity: int = 5000,  # Max values kept per incremental indicator
+            start: bool = True  # False to call new_timeframed_execution() directly instead of scheduling it
             # STORE IDS: Two types
             # ASSET ID -> <timeframe>_ASSET#<source.__class__.__name__>#<asset_name> -> Ej: 5_ASSET#BalanzWebsocketInputSource#GFGC10608J
             # INDICATOR ID -> <timeframe>_INDICATOR#<source.__class__.__name__>#<asset_name>#<config_id_to_str> -> Ej: 5_INDICATOR#BalanzWebsocketInputSource#GFGC10608J#SampleIndicator#timeframe=5#min_length=10#sma_length=10
@@ -27,139 +32,199 @@ class DataStore:
         self.input_store = input_store
         self.data_store = data_store
 
+        # Integer IDs and precomputed store keys of every asset, timeframe and indicator config
+        self.registry = Registry(indicators)
         self.timeframed_assets_definitions, self.timeframed_indicators_definitions = self.define_timeframed_objects_to_compute(
-            indicators)
+            self.registry)
+
+        # Bars live in shared memory, the Agent and the pool workers map them without copies
+        self.timeframed_assets_store: Dict[str, BarBuffer] = bar_builder.bars
+
+        # Indicators with known output columns publish their values to shared memory:
+        # - Batch: one vectorized call per indicator class and timeframe, for all its configs and assets
+        # - Incremental: updated in the scheduler process, where their state is kept
+        # The rest are computed by the pool one by one into data_store
+        self.timeframed_indicators_batches: Dict[str, Dict[str, Any]] = {}  # timeframe -> class name -> batch
+        self.timeframed_indicators_streams: Dict[str, IndicatorStream] = {}
+        self.timeframed_indicators_store: Dict[str, IndicatorBuffer] = {}
+        self.timeframed_indicators_bars_count: Dict[str, int] = {}
+        for timeframe, definitions in self.timeframed_indicators_definitions.items():
+            self.timeframed_indicators_batches[timeframe] = {}
+
+            for definition in definitions.values():
+                indicator, indicator_config = definition['indicator'], definition['indicator_config']
+                tf_indicator_config_k = definition['key']
+
+                if indicator.has_batch():
+                    self.add_to_batch(timeframe, tf_indicator_config_k, definition)
+                    columns = indicator.columns(indicator_config)
+                else:
+                    stream = indicator.stream(indicator_config)
+                    if stream is None:
+                        continue
+                    self.timeframed_indicators_streams[tf_indicator_config_k] = stream
+                    self.timeframed_indicators_bars_count[tf_indicator_config_k] = 0
+                    columns = stream.columns
+
+                self.timeframed_indicators_store[tf_indicator_config_k] = IndicatorBuffer(
+                    columns=columns, capacity=indicators_capacity
+                )
+
         self.WORKERS_POOL_SIZE = os.cpu_count() - 2
+        # Runs new_timeframed_execution() on every bar boundary, its executions are published to shared memory.
+        # Only allocated when started, replays call new_timeframed_execution() themselves
+        self.scheduler: Optional[TimeframeScheduler] = None
 
-        threading.Thread(target=self.start_scheduler).start()
+        if start:
+            self.scheduler = TimeframeScheduler(list(self.timeframed_assets_definitions.keys()))
+            threading.Thread(target=self.start_scheduler).start()
 
     def start_scheduler(self):
+        get_metrics().start_export('data_store')
 
         with multiprocessing.Pool(processes=self.WORKERS_POOL_SIZE) as pool:
-            timeframe_in_seconds = [int(t) for t in self.timeframed_assets_definitions.keys()]
-            for timeframe in timeframe_in_seconds:
-                schedule.every(timeframe).seconds.do(
-                    self.new_timeframed_execution,
-                    timeframe=str(timeframe),
-                    pool=pool,
-                    data_store=self.data_store,
-                    input_store=self.input_store
-                )
-
-            while True:
-                schedule.run_pending()
-                time.sleep(min(timeframe_in_seconds))
+            threads = self.scheduler.start(
+                lambda timeframe: self.new_timeframed_execution(timeframe, pool=pool, data_store=self.data_store)
+            )
+            for thread in threads:
+                thread.join()
 
     def new_timeframed_execution(
             self, timeframe: str,
             pool: multiprocessing.Pool,
-            data_store: Dict[str, Any],
-            input_store: Dict[str, Any]
+            data_store: Dict[str, Any]
     ):
 
-        assets_params = [
-            (str(asset), timeframe, data_store, input_store)
-            for asset in self.timeframed_assets_definitions[timeframe].keys()
-        ]
-        pool.starmap(self.compute_timeframed_asset, assets_params)
+        batches_params = [(timeframe, class_name) for class_name in self.timeframed_indicators_batches[timeframe].keys()]
+        if len(batches_params) > 0:
+            pool.starmap(self.compute_timeframed_batch, batches_params)
+
+        definitions = self.timeframed_indicators_definitions[timeframe].values()
+        for definition in definitions:
+            if definition['key'] in self.timeframed_indicators_streams.keys():
+                self.update_timeframed_indicator(
+                    definition['key'], definition['bars_key'], definition['indicator_config']
+                )
 
         indicator_params = [
             (
-                indicator_config_id,
-                timeframe,
+                definition['key'],
+                definition['bars_key'],
                 data_store,
-                self.timeframed_indicators_definitions[timeframe][indicator_config_id]['asset'],
-                self.timeframed_indicators_definitions[timeframe][indicator_config_id]['indicator'],
-                self.timeframed_indicators_definitions[timeframe][indicator_config_id]['indicator_config']
+                definition['indicator'],
+                definition['indicator_config']
             )
-            for indicator_config_id in self.timeframed_indicators_definitions[timeframe].keys()
+            for definition in definitions
+            if definition['key'] not in self.timeframed_indicators_store.keys()
         ]
-        pool.starmap(self.compute_timeframed_indicator, indicator_params)
-
-    def compute_timeframed_asset(self, asset_id: str, timeframe: str, data_store: Dict[str, Any],
-                                 input_store: Dict[str, Any]):
-        def new_tf(df: pd.DataFrame) -> pd.DataFrame:
-            df = df[df.index > (datetime.now() - timedelta(seconds=int(timeframe)))]
-            if len(df) == 0:
-                return pd.DataFrame([])
-
-            prices = df['last_price']
-            vol = df['volume']
-            return pd.DataFrame({
-                'Time': datetime.now(),
-                'Open': prices.iloc[0],
-                'High': prices.max(),
-                'Low': prices.min(),
-                'Close': prices.iloc[-1],
-                'Volume': vol.sum(),
-            }, index=[0])
-
-        tf_asset_key = f'{timeframe}_{asset_id}'
-
-        if tf_asset_key not in data_store.keys():
-            data_store[tf_asset_key] = pd.DataFrame()
-
-        if asset_id not in input_store.keys():
-            return None
-
-        new_df = new_tf(input_store[asset_id])
-        if len(new_df) == 0 and len(data_store[tf_asset_key]):
-            new_df = data_store[tf_asset_key].iloc[-1:]
-
-        data_store[tf_asset_key] = pd.concat([
-            data_store[tf_asset_key],
-            new_df
-        ], ignore_index=True)
-
-    def compute_timeframed_indicator(self, indicator_config_id: str, timeframe: str, data_store: Dict[str, Any],
-                                     asset: Asset, indicator: Indicator, indicator_config: IndicatorConfiguration):
-
-        asset_id = f'ASSET#{str(asset)}'
-        tf_asset_key = f'{timeframe}_{asset_id}'
-        tf_indicator_config_k = f'{timeframe}_{indicator_config_id}'
+        if len(indicator_params) > 0:
+            pool.starmap(self.compute_timeframed_indicator, indicator_params)
+
+    def add_to_batch(self, timeframe: str, tf_indicator_config_k: str, definition: Dict[str, Any]) -> None:
+        indicator, indicator_config = definition['indicator'], definition['indicator_config']
+        batches = self.timeframed_indicators_batches[timeframe]
+        class_name = indicator.__class__.__name__
+
+        if class_name not in batches.keys():
+            batches[class_name] = {'indicator': indicator, 'assets': [], 'configs': [], 'outputs': []}
+        batch = batches[class_name]
+
+        tf_asset_key = definition['bars_key']
+        if tf_asset_key not in batch['assets']:
+            batch['assets'].append(tf_asset_key)
+        configs_ids = [config.key for config in batch['configs']]
+        if indicator_config.key not in configs_ids:
+            batch['configs'].append(indicator_config)
+            configs_ids.append(indicator_config.key)
+
+        # Where to find the values of this indicator in the batch result
+        batch['outputs'].append((
+            tf_indicator_config_k,
+            configs_ids.index(indicator_config.key),
+            batch['assets'].index(tf_asset_key)
+        ))
+
+    def compute_timeframed_batch(self, timeframe: str, class_name: str):
+        batch = self.timeframed_indicators_batches[timeframe][class_name]
+        n_bars = max(config.min_length for config in batch['configs'])
+
+        # Assets x bars matrices aligned to the last bar
+        bars_columns = {column: np.full((len(batch['assets']), n_bars), np.nan) for column in BAR_COLUMNS}
+        last_bars = []
+        for i, tf_asset_key in enumerate(batch['assets']):
+            times, values, count = self.timeframed_assets_store[tf_asset_key].snapshot(n_bars)
+            for j, column in enumerate(BAR_COLUMNS):
+                bars_columns[column][i, n_bars - len(values):] = values[:, j]
+            last_bars.append((times[-1] if len(times) > 0 else None, count))
+
+        results = batch['indicator'].compute_batch(bars_columns, batch['configs'])
+
+        for tf_indicator_config_k, config_index, asset_index in batch['outputs']:
+            last_time, count = last_bars[asset_index]
+            output = self.timeframed_indicators_store[tf_indicator_config_k]
+
+            # Only one value per bar, once min_length bars are available
+            if (last_time is None or count < batch['configs'][config_index].min_length
+                    or (len(output) > 0 and output.view(1)[0][0] == last_time)):
+                continue
+            output.append(last_time, results[config_index, asset_index])
+
+    def update_timeframed_indicator(self, tf_indicator_config_k: str, tf_asset_key: str,
+                                    indicator_config: IndicatorConfiguration):
+
+        bars = self.timeframed_assets_store[tf_asset_key]
+        stream = self.timeframed_indicators_streams[tf_indicator_config_k]
+        output = self.timeframed_indicators_store[tf_indicator_config_k]
+
+        # Feed the bars closed since the last update, usually just one
+        times, values, count = bars.snapshot(bars.count - self.timeframed_indicators_bars_count[tf_indicator_config_k])
+        for i, (bar_time, bar_values) in enumerate(zip(times, values)):
+            result = stream.update(dict(zip(bars.columns, bar_values)))
+
+            # Same warm up as compute(): no values until min_length bars are available
+            if count - len(values) + i + 1 >= indicator_config.min_length:
+                output.append(bar_time, [result[column] for column in output.columns])
+
+        self.timeframed_indicators_bars_count[tf_indicator_config_k] = count
+
+    def get_indicator(self, indicator_id: str) -> pd.DataFrame:
+        if indicator_id in self.timeframed_indicators_store.keys():
+            return self.timeframed_indicators_store[indicator_id].to_frame()
+        return self.data_store[indicator_id]
+
+    def compute_timeframed_indicator(self, tf_indicator_config_k: str, tf_asset_key: str, data_store: Dict[str, Any],
+                                     indicator: Indicator, indicator_config: IndicatorConfiguration):
+
+        bars = self.timeframed_assets_store[tf_asset_key]
 
         if tf_indicator_config_k not in data_store.keys():
             data_store[tf_indicator_config_k] = pd.DataFrame()
 
-        if tf_asset_key in data_store.keys() and len(data_store[tf_asset_key]) >= indicator_config.min_length:
+        if len(bars) >= indicator_config.min_length:
             data_store[tf_indicator_config_k] = pd.concat([
                 data_store[tf_indicator_config_k],
                 indicator.compute(
-                    data_store[tf_asset_key].iloc[-indicator_config.min_length:],
+                    bars.to_frame(indicator_config.min_length),
                     indicator_config
                 )
             ], ignore_index=True)
 
-    def define_timeframed_objects_to_compute(self, indicators: List[Indicator]) -> Tuple[
-        Dict[str, Any], Dict[str, Any]]:
+    def define_timeframed_objects_to_compute(self, registry: Registry) -> Tuple[Dict[str, Any], Dict[str, Any]]:
         timeframed_assets, timeframed_indicators = {}, {}
 
-        combinations = [
-            (indicator, indicator_config, asset)
-            for indicator in indicators
-            for indicator_config in indicator.config
-            for asset in indicator.assets
-        ]
-
-        for indicator, indicator_config, asset in combinations:
-            asset_id = "#".join(['ASSET', str(asset)])
-            indicator_config_id = "#".join(
-                ['INDICATOR', str(asset), indicator.__class__.__name__, str(indicator_config)])
-
-            if indicator_config.timeframe not in timeframed_indicators.keys():
-                timeframed_assets[indicator_config.timeframe] = {}
-                timeframed_indicators[indicator_config.timeframe] = {}
-
-            if asset_id not in timeframed_assets[indicator_config.timeframe].keys():
-                timeframed_assets[indicator_config.timeframe][asset_id] = {
-                    'asset': asset
-                }
-
-            if indicator_config_id not in timeframed_indicators[indicator_config.timeframe].keys():
-                timeframed_indicators[indicator_config.timeframe][indicator_config_id] = {
-                    'asset': asset,
-                    'indicator': indicator,
-                    'indicator_config': indicator_config
-                }
+        for indicator_id, (indicator, indicator_config, asset_id, timeframe_id) in enumerate(registry.indicators):
+            timeframe = registry.timeframes[timeframe_id]
+            asset = registry.assets[asset_id]
+            # INDICATOR#<source.__class__.__name__>#<asset_name>#<indicator>#<config>, the key without timeframe
+            indicator_config_id = registry.indicators_keys[indicator_id][len(timeframe) + 1:]
+
+            timeframed_assets.setdefault(timeframe, {}).setdefault(registry.assets_keys[asset_id], {'asset': asset})
+            timeframed_indicators.setdefault(timeframe, {})[indicator_config_id] = {
+                'asset': asset,
+                'indicator': indicator,
+                'indicator_config': indicator_config,
+                'key': registry.indicators_keys[indicator_id],
+                'bars_key': registry.bars_keys[timeframe_id][asset_id]
+            }
 
         return timeframed_assets, timeframed_indicators
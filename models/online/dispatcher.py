@@ -0,0 +1,146 @@
+import multiprocessing
+import queue
+import time
+from typing import Any, Dict, List, Tuple
+
+from models.online.metrics import get_metrics, get_queue_depth
+from models.tick import now_ns
+
+# Counters slots
+RECEIVED = 0  # Notifications read from the InputStore queue
+DROPPED = 1  # Notifications of tickers that do not trigger any strategy
+REQUESTED = 2  # Evaluations the notifications asked for, one per triggered strategy
+COALESCED = 3  # Requested evaluations merged into a pending one of the same (strategy, ticker)
+EVALUATED = 4  # Evaluations run by the workers
+COUNTERS = ['received', 'dropped', 'requested', 'coalesced', 'evaluated']
+
+
+class Dispatcher:
+    """
+    Evaluates the strategies triggered by the InputStore notifications in worker processes. Every strategy is
+    pinned to one worker, so its state (portfolio, evaluation plans) lives in a single process.
+
+    Notifications are coalesced per (strategy, ticker): while a worker is busy, the pending evaluations of the
+    same (strategy, ticker) are merged into one that reads the latest data when it runs, so bursts never leave
+    strategies evaluating stale snapshots.
+    """
+
+    def __init__(self, agent: Any, workers: int = 1, max_batch: int = 1000, report_interval: float = 60):
+        self.agent = agent
+        self.workers = max(1, min(workers, len(agent.strategies)))
+        self.max_batch = max_batch  # Max notifications coalesced at once
+        self.report_interval = report_interval  # Seconds between stats prints, None to disable
+
+        # Ticker -> indexes of the strategies it triggers, each one once
+        self.strategies_by_ticker: Dict[str, List[int]] = {}
+        for ticker, strategies in agent.input_strategies_map.items():
+            self.strategies_by_ticker[ticker] = list(dict.fromkeys(
+                i for i, s in enumerate(agent.strategies) for strategy in strategies if s is strategy
+            ))
+
+        # Created before starting the processes so all of them share them
+        self.queues = [multiprocessing.Queue() for _ in range(self.workers)]
+        self.counters = multiprocessing.Array('q', len(COUNTERS))
+
+    def get_worker(self, strategy_index: int) -> int:
+        return strategy_index % self.workers
+
+    def start(self) -> None:
+        for worker in range(self.workers):
+            multiprocessing.Process(target=Dispatcher.work, args=(self, worker)).start()
+        multiprocessing.Process(target=Dispatcher.dispatch, args=(self,)).start()
+
+    def add(self, counts: Dict[int, int]) -> None:
+        with self.counters.get_lock():
+            for slot, count in counts.items():
+                self.counters[slot] += count
+
+    @staticmethod
+    def drain(source: multiprocessing.Queue, first: Any, limit: int) -> List[Any]:
+        # First message plus whatever arrived meanwhile, without blocking
+        messages = [first]
+        while len(messages) < limit:
+            try:
+                messages.append(source.get_nowait())
+            except queue.Empty:
+                break
+        return messages
+
+    def dispatch(self) -> None:
+        notifications = self.agent.input_store.input_notification_queue
+        last_report = time.monotonic()
+
+        metrics = get_metrics()
+        metrics.add_gauge('notification_queue_depth', lambda: get_queue_depth(notifications))
+        for worker, worker_queue in enumerate(self.queues):
+            metrics.add_gauge(f'worker_{worker}_queue_depth', lambda q=worker_queue: get_queue_depth(q))
+        metrics.start_export('dispatcher')
+
+        while True:
+            tickers = self.drain(notifications, notifications.get(), self.max_batch)
+            if None in tickers:
+                for worker_queue in self.queues:
+                    worker_queue.put(None)
+                print('Agent dispatcher turned off')
+                break
+
+            batches: List[List[Tuple[int, str]]] = [[] for _ in range(self.workers)]
+            requested = dropped = 0
+            # Coalesced per ticker, in arrival order
+            for ticker in tickers:
+                strategies = self.strategies_by_ticker.get(ticker, [])
+                requested += len(strategies)
+                dropped += len(strategies) == 0
+            for ticker in dict.fromkeys(tickers):
+                for strategy_index in self.strategies_by_ticker.get(ticker, []):
+                    batches[self.get_worker(strategy_index)].append((strategy_index, ticker))
+
+            dispatched = 0
+            for worker, batch in enumerate(batches):
+                if len(batch) > 0:
+                    self.queues[worker].put(batch)
+                    dispatched += len(batch)
+
+            self.add({RECEIVED: len(tickers), DROPPED: dropped, REQUESTED: requested,
+                      COALESCED: requested - dispatched})
+
+            if self.report_interval is not None and time.monotonic() - last_report >= self.report_interval:
+                last_report = time.monotonic()
+                print(f'Agent dispatcher stats: {self.stats()}')
+
+    def work(self, worker: int) -> None:
+        worker_queue = self.queues[worker]
+        metrics = get_metrics()
+        metrics.add_gauge('queue_depth', lambda: get_queue_depth(worker_queue))
+        metrics.start_export(f'worker_{worker}')
+
+        while True:
+            batches = self.drain(worker_queue, worker_queue.get(), self.max_batch)
+            stop = None in batches
+
+            pending = [item for batch in batches if batch is not None for item in batch]
+            evaluations = list(dict.fromkeys(pending))
+            for strategy_index, ticker in evaluations:
+                started = time.monotonic_ns()
+                self.agent.process_strategy_by_ticker(self.agent.strategies[strategy_index], ticker)
+                metrics.record('strategy', time.monotonic_ns() - started)
+                self.record_tick_to_strategy(metrics, ticker)
+
+            self.add({COALESCED: len(pending) - len(evaluations), EVALUATED: len(evaluations)})
+            if stop:
+                break
+
+    def record_tick_to_strategy(self, metrics: Any, ticker: str) -> None:
+        # The tick is received and evaluated in different processes, measured with the wall clock of its time
+        ticks = self.agent.input_store.get_buffer(ticker)
+        if ticks is not None and len(ticks) > 0:
+            metrics.record('tick_to_strategy', now_ns() - int(ticks.view(1)[0][0]))
+
+    def stats(self) -> Dict[str, int]:
+        with self.counters.get_lock():
+            stats = {name: int(self.counters[slot]) for slot, name in enumerate(COUNTERS)}
+
+        stats['queue_depth'] = get_queue_depth(self.agent.input_store.input_notification_queue)
+        for worker, worker_queue in enumerate(self.queues):
+            stats[f'worker_{worker}_queue_depth'] = get_queue_depth(worker_queue)
+        return stats
@@ -0,0 +1,185 @@
+from typing import List, Dict, Optional, Tuple, Any
+
+import numpy as np
+import pandas as pd
+
+from models.online.ring_buffer import RingBuffer
+from models.options.risk import PortfolioRisk
+from models.options.surface import VolatilitySurface
+from models.order_book import OrderBook
+from models.tick import TICK_COLUMNS
+
+
+class PlanSlot:
+    """
+    Preallocated copy of the last rows of one store, refilled on every evaluation.
+    times[:length] and values[:length] hold the valid rows, oldest first.
+    """
+
+    def __init__(self, key: str, prefix: str, buffer: Optional[RingBuffer], columns: Optional[List[str]],
+                 window: int):
+        self.key = key  # Store key
+        self.prefix = prefix  # Prefix of the DataFrame columns
+        self.buffer = buffer  # None for the indicators computed into the DataStore data_store dict
+        self.window = window
+        self.length = 0
+        self.count = 0  # Rows appended to the store when filled
+
+        self.times = np.zeros(window, dtype=np.int64)
+        self.columns: List[str] = []
+        self.columns_index: Dict[str, int] = {}
+        self.values = np.empty((window, 0))
+        if columns is not None:
+            self.set_columns(columns)
+
+    def set_columns(self, columns: List[str]) -> None:
+        self.columns = list(columns)
+        self.columns_index = {column: i for i, column in enumerate(self.columns)}
+        self.values = np.full((self.window, len(self.columns)), np.nan)
+
+    def is_ready(self, data_store: Dict[str, pd.DataFrame]) -> bool:
+        if self.buffer is not None:
+            return len(self.buffer) > 0
+        return self.key in data_store
+
+    def fill(self, data_store: Dict[str, pd.DataFrame]) -> None:
+        if self.buffer is not None:
+            self.length, self.count = self.buffer.read_into(self.times, self.values)
+            return
+
+        df = data_store[self.key].tail(self.window)
+        if list(df.columns) != self.columns:
+            self.set_columns(list(df.columns))
+        self.length = self.count = len(df)
+        self.times[:self.length] = df.index.to_numpy(dtype=np.int64)
+        self.values[:self.length] = df.to_numpy(dtype=np.float64, na_value=np.nan)
+
+    def column(self, name: str) -> np.ndarray:
+        # View of the valid rows of a column
+        return self.values[:self.length, self.columns_index[name]]
+
+    def last(self, name: str) -> float:
+        return float(self.values[self.length - 1, self.columns_index[name]]) if self.length > 0 else np.nan
+
+
+class EvaluationPlan:
+    """
+    Inputs of one strategy evaluation triggered by one ticker, resolved once at startup: the stores to read, their
+    column layouts and prefixes. Every evaluation only copies the last rows of those stores into the preallocated
+    slots (fill()), to_frames() builds the DataFrames evaluate() expects from the same stores.
+
+    Slots:
+        real_time_assets: <alias or ticker> -> last ticks_window ticks
+        timeframed_assets: <timeframe>#<alias or ticker> -> last bars_window bars
+        timeframed_indicators: <timeframe>#<alias or ticker> -> last bars_window values of every indicator config
+    books: <alias or ticker> -> OrderBook of the last tick of every real time asset
+    surface_snapshot: (version, nodes x SURFACE_FIELDS view, spot) of the VolatilitySurface, read by sync_surface()
+    portfolio_risk: PortfolioRisk.update() of the strategy portfolio with that surface
+    """
+
+    def __init__(self, strategy: Any, activation_ticker: str, data_store: Any, input_store: Dict[str, RingBuffer],
+                 ticks_window: int, bars_window: int, surface: Optional[VolatilitySurface] = None,
+                 risk: Optional[PortfolioRisk] = None):
+        registry = data_store.registry
+        self.data_store = data_store
+        self.input_store = input_store
+        self.surface = surface
+        self.surface_snapshot: Optional[Tuple[int, np.ndarray, float]] = None
+        self.portfolio = strategy.config.portfolio
+        self.risk = risk  # Shared by the plans of the strategy
+        self.portfolio_risk: Optional[Dict[str, Any]] = None
+
+        self.real_time_assets: Dict[str, PlanSlot] = {}
+        self.books: Dict[str, OrderBook] = {}
+        self.timeframed_assets: Dict[str, PlanSlot] = {}
+        self.timeframed_indicators: Dict[str, List[PlanSlot]] = {}
+        self.indicators_slots: List[PlanSlot] = []  # Same slots, in evaluation order
+        self.timeframed_assets_definition_map: Dict[str, List[str]] = {}  # timeframe -> List[ticker]
+        # False when some input is never computed (ej: the activation ticker is not an asset of the indicator)
+        self.valid = True
+
+        activation_asset_id = registry.assets_index.get(activation_ticker, None)
+        for indicator in strategy.config.indicators:
+            for i_config, asset in [(i_config, asset) for i_config in indicator.config for asset in indicator.assets]:
+                asset_id = registry.assets_index[asset.key]
+                timeframe_id = registry.timeframes_index[i_config.timeframe]
+                # The indicator is read from the activation ticker, as it always was
+                indicator_id = None if activation_asset_id is None else registry.get_indicator_id(
+                    activation_asset_id, indicator, i_config)
+                asset_key = registry.assets_keys[asset_id]
+
+                if indicator_id is None or asset_key not in input_store.keys():
+                    self.valid = False
+                    continue
+
+                real_time_asset_prefix = asset.strategy_alias if asset.strategy_alias != "" else asset.ticker
+                timeframed_prefix = f'{i_config.timeframe}#{real_time_asset_prefix}'
+
+                assets_definitions = self.timeframed_assets_definition_map.setdefault(i_config.timeframe, [])
+                if real_time_asset_prefix not in assets_definitions:
+                    assets_definitions.append(real_time_asset_prefix)
+
+                if real_time_asset_prefix not in self.real_time_assets.keys():
+                    self.real_time_assets[real_time_asset_prefix] = PlanSlot(
+                        asset_key, real_time_asset_prefix, input_store[asset_key], TICK_COLUMNS, ticks_window
+                    )
+                    self.books[real_time_asset_prefix] = OrderBook()
+
+                bars_key = registry.bars_keys[timeframe_id][asset_id]
+                if timeframed_prefix not in self.timeframed_assets.keys():
+                    bars = data_store.timeframed_assets_store[bars_key]
+                    self.timeframed_assets[timeframed_prefix] = PlanSlot(
+                        bars_key, timeframed_prefix, bars, bars.columns, bars_window
+                    )
+
+                indicator_key = registry.indicators_keys[indicator_id]
+                indicator_buffer = data_store.timeframed_indicators_store.get(indicator_key, None)
+                indicator_slot = PlanSlot(
+                    indicator_key, timeframed_prefix, indicator_buffer,
+                    indicator_buffer.columns if indicator_buffer is not None else None, bars_window
+                )
+                self.timeframed_indicators.setdefault(timeframed_prefix, []).append(indicator_slot)
+                self.indicators_slots.append(indicator_slot)
+
+        self.slots: List[PlanSlot] = (
+            list(self.real_time_assets.values()) + list(self.timeframed_assets.values()) + self.indicators_slots
+        )
+
+    def is_ready(self) -> bool:
+        return self.valid and all(slot.is_ready(self.data_store.data_store) for slot in self.slots)
+
+    def fill(self) -> None:
+        for slot in self.slots:
+            slot.fill(self.data_store.data_store)
+        for prefix, book in self.books.items():
+            slot = self.real_time_assets[prefix]
+            if slot.length > 0:
+                book.update(slot.values[slot.length - 1])
+
+    def sync_surface(self) -> None:
+        # Last published surface and the portfolio risk with it. The surface is not copied: compare its version with surface.is_current() before reusing it
+        if self.surface is not None:
+            self.surface_snapshot = self.surface.snapshot()
+        if self.risk is not None:
+            # Only the nodes whose marks or positions changed since the last evaluation are recomputed
+            self.portfolio_risk = self.risk.update(self.portfolio)
+
+    def to_frames(self) -> Tuple[pd.DataFrame, pd.DataFrame, pd.DataFrame, Dict[str, List[str]]]:
+        """
+        Compatibility mode: the DataFrames evaluate() receives, with every column prefixed by its slot prefix.
+        Returns (real_time_assets, timeframed_indicators, timeframed_assets, timeframed_assets_definition_map)
+        """
+        real_time_assets = pd.concat([
+            slot.buffer.to_frame(slot.window).add_prefix(f'{slot.prefix}#')
+            for slot in self.real_time_assets.values()
+        ], axis=1)
+        timeframed_assets = pd.concat([
+            slot.buffer.to_frame().add_prefix(f'{slot.prefix}#')
+            for slot in self.timeframed_assets.values()
+        ], axis=1)
+        timeframed_indicators = pd.concat([
+            self.data_store.get_indicator(slot.key).add_prefix(f'{slot.prefix}#')
+            for slot in self.indicators_slots
+        ], axis=1)
+
+        return real_time_assets, timeframed_indicators, timeframed_assets, self.timeframed_assets_definition_map
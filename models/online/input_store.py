@@ -1,10 +1,16 @@
 import multiprocessing
+import queue
 from multiprocessing import Queue
-from typing import Any, List, Dict
-
-import pandas as pd
+from time import monotonic_ns
+from typing import Any, List, Dict, Optional
 
 from models.asset import Asset
+from models.online.bar_builder import BarBuilder
+from models.online.metrics import get_metrics, get_queue_depth
+from models.online.registry import Registry
+from models.online.ring_buffer import TickBuffer
+from models.options.surface import VolatilitySurface
+from models.tick import Tick, now_ns
 
 
 class InputStore:
@@ -13,12 +19,25 @@ class InputStore:
             self,
             assets: List[Asset],
             input_notification_queue: Queue,
-            store: Dict[str, pd.DataFrame]
-            # STORE IDS: ASSET#<source.__class__.__name__>#<asset_name> -> Ej: ASSET#BalanzWebsocketInputSource#GGAL
+            capacity: int = 10000,  # Max ticks kept per asset, older ones are evicted
+            bar_builder: Optional[BarBuilder] = None,  # Timeframed bars built from the incoming ticks
+            start: bool = True,  # False to feed the store with add_to_store() instead of the sources (backtests)
+            surface: Optional[VolatilitySurface] = None  # Implied volatilities updated from the incoming ticks
     ):
         # This queue will notify when a source_asset is updated
         self.input_notification_queue = input_notification_queue
-        self.store = store
+        self.bar_builder = bar_builder
+        self.surface = surface
+
+        # Asset IDs of the ticks source tickers (<source_name>#<asset_name>) and their precomputed store IDs
+        self.registry = Registry([], assets)
+
+        # STORE IDS: ASSET#<source.__class__.__name__>#<asset_name> -> Ej: ASSET#BalanzWebsocketInputSource#GGAL
+        # Buffers are allocated before starting the processes so all of them share the same memory
+        self.store: Dict[str, TickBuffer] = {
+            store_id: TickBuffer(capacity=capacity) for store_id in self.registry.assets_keys
+        }
+        self.buffers: List[TickBuffer] = [self.store[store_id] for store_id in self.registry.assets_keys]
 
         # Map that defines which sources and assets must be used
         self.assets_sources_map = self.define_assets_and_sources_requirements(assets)
@@ -28,6 +47,10 @@ class InputStore:
         if len(self.assets_sources_map.keys()) > 1:
             raise Exception("More than one input sources defined")
 
+        if start:
+            self.start()
+
+    def start(self) -> None:
         # Get data from sources using first core
         for source_name in self.assets_sources_map.keys():
             source = self.assets_sources_map[source_name]['source']
@@ -50,26 +73,58 @@ class InputStore:
         listener_process.start()
 
     def listen_to_websockets(self) -> Any:
+        metrics = get_metrics()
+        metrics.add_gauge('internal_queue_depth', lambda: get_queue_depth(self.internal_queue))
+        metrics.add_gauge('notification_queue_depth', lambda: get_queue_depth(self.input_notification_queue))
+        metrics.start_export('input_store')
+
         while True:
-            source_ticker, df = self.internal_queue.get()
-            if source_ticker is None or df is None:
+            try:
+                batch = self.internal_queue.get(timeout=self.get_timeout())
+            except queue.Empty:
+                # Nothing arrived before the next bar boundary
+                self.bar_builder.close_due(now_ns())
+                continue
+
+            if batch is None:
                 print('Input Store listener turned off')
                 break
 
-            self.add_to_store(source_ticker, df)
-
-            # Notifying other resources with a message like <source_name>#<asset_name>
-            self.input_notification_queue.put(source_ticker)
-
-    def add_to_store(self, store_id: str, df: pd.DataFrame):
-        store_id = "ASSET#" + store_id
-        if store_id not in self.store.keys():
-            self.store[store_id] = df
-        else:
-            self.store[store_id] = pd.concat([
-                self.store[store_id],
-                df
-            ])
+            for tick in batch:
+                started = monotonic_ns()
+                if tick.received > 0:
+                    metrics.record('ingest', started - tick.received)
+                self.add_to_store(tick)
+                metrics.record('store', monotonic_ns() - started)
+
+                # Notifying other resources with a message like <source_name>#<asset_name>
+                self.input_notification_queue.put(tick.source_ticker)
+
+    def add_to_store(self, tick: Tick):
+        asset_id = self.registry.assets_index.get(tick.source_ticker, None)
+        if asset_id is None:
+            print(f'Skipping {tick.source_ticker} because it is not defined in any indicator')
+            return None
+
+        store_id = self.registry.assets_keys[asset_id]
+        self.buffers[asset_id].append(tick.time, tick.values)
+
+        if self.bar_builder is not None:
+            self.bar_builder.update(store_id, tick.time, tick.last_price, tick.volume)
+
+        if self.surface is not None:
+            self.surface.update(store_id, tick)
+
+    def get_buffer(self, source_ticker: str) -> Optional[TickBuffer]:
+        # Ticks of <source_name>#<asset_name>, None if it is not stored
+        asset_id = self.registry.assets_index.get(source_ticker, None)
+        return None if asset_id is None else self.buffers[asset_id]
+
+    def get_timeout(self) -> Optional[float]:
+        if self.bar_builder is None:
+            return None
+        now = now_ns()
+        return max(0, self.bar_builder.next_deadline(now) - now) / 1e9
 
     def define_assets_and_sources_requirements(self, assets: List[Asset]):
         """
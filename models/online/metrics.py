@@ -0,0 +1,191 @@
+import glob
+import json
+import os
+import threading
+import time
+from datetime import datetime
+from multiprocessing import Queue
+from typing import Dict, Callable, Optional, Any
+
+import numpy as np
+import pandas as pd
+
+# Directory of the per process snapshot files and seconds between exports
+METRICS_DIRECTORY = os.environ.get('METRICS_DIRECTORY', 'metrics')
+EXPORT_INTERVAL = 10
+
+# Log-linear buckets: values under SUB_BUCKETS ns are exact, every power of two above is split in HALF buckets,
+# so recorded values keep a relative error under 1 / HALF
+SUB_BUCKET_BITS = 7
+SUB_BUCKETS = 1 << SUB_BUCKET_BITS
+HALF = SUB_BUCKETS >> 1
+MAX_EXPONENT = 40  # Up to 2^47 ns (39 hours), larger values are counted in the last bucket
+BUCKETS = SUB_BUCKETS + MAX_EXPONENT * HALF
+
+
+def bucket_index(value: int) -> int:
+    if value < SUB_BUCKETS:
+        return max(0, value)
+    exponent = value.bit_length() - SUB_BUCKET_BITS
+    return min(SUB_BUCKETS + (exponent - 1) * HALF + (value >> exponent) - HALF, BUCKETS - 1)
+
+
+def bucket_value(index: int) -> float:
+    # Middle of the values counted in the bucket
+    if index < SUB_BUCKETS:
+        return float(index)
+    exponent = (index - SUB_BUCKETS) // HALF + 1
+    return float(((index - SUB_BUCKETS) % HALF + HALF) << exponent) + ((1 << exponent) - 1) / 2
+
+
+class LatencyHistogram:
+    """
+    HDR style histogram of ns durations: fixed log-linear buckets, O(1) record without allocations and
+    percentiles in O(buckets). The exact max is kept apart.
+    """
+
+    def __init__(self):
+        self.counts = [0] * BUCKETS  # Plain list, increments are much cheaper than on an array
+        self.total = 0
+        self.max = 0
+
+    def record(self, value: int) -> None:
+        self.counts[bucket_index(value)] += 1
+        self.total += 1
+        if value > self.max:
+            self.max = value
+
+    def merge(self, buckets: Dict[int, int], max_value: int) -> None:
+        for index, count in buckets.items():
+            self.counts[int(index)] += count
+            self.total += count
+        self.max = max(self.max, max_value)
+
+    def percentile(self, q: float) -> float:
+        # ns, NaN without values
+        if self.total == 0:
+            return np.nan
+        index = int(np.searchsorted(np.cumsum(self.counts), max(1, int(np.ceil(self.total * q / 100)))))
+        return min(bucket_value(index), float(self.max))
+
+    def to_dict(self) -> Dict[str, Any]:
+        # Seconds, buckets are kept so the snapshots of several processes can be merged
+        return {
+            'count': self.total,
+            'p50': self.percentile(50) / 1e9,
+            'p99': self.percentile(99) / 1e9,
+            'max': self.max / 1e9,
+            'buckets': {index: count for index, count in enumerate(self.counts) if count > 0},
+            'max_ns': self.max
+        }
+
+
+class Metrics:
+    """
+    Latency histograms per pipeline stage and queue depth gauges of one process. Every process records into its
+    own instance (get_metrics()) and, once started, exports it to <directory>/<process_name>.json periodically.
+
+    Stages (ns): ingest (source receive -> InputStore listener), store (InputStore append, bars and surface),
+    bar (boundary -> bar closed), indicator (boundary -> indicators computed), strategy (evaluation),
+    tick_to_strategy (tick receive -> evaluation finished), order (submit -> ack).
+    """
+
+    def __init__(self):
+        self.pid = os.getpid()
+        self.process_name = str(self.pid)
+        self.histograms: Dict[str, LatencyHistogram] = {}
+        self.gauges: Dict[str, Callable[[], float]] = {}
+        # Only guards the creation of histograms: records never block, concurrent records of the same stage
+        # (order threads) may rarely lose a count
+        self.lock = threading.Lock()
+        self.exporter: Optional[threading.Thread] = None
+
+    def record(self, stage: str, value: int) -> None:
+        histogram = self.histograms.get(stage)
+        if histogram is None:
+            with self.lock:
+                histogram = self.histograms.setdefault(stage, LatencyHistogram())
+        histogram.record(value)
+
+    def add_gauge(self, name: str, gauge: Callable[[], float]) -> None:
+        self.gauges[name] = gauge
+
+    def snapshot(self) -> Dict[str, Any]:
+        gauges = {}
+        for name, gauge in self.gauges.items():
+            try:
+                gauges[name] = gauge()
+            except Exception:
+                gauges[name] = None
+
+        stages = {stage: histogram.to_dict() for stage, histogram in list(self.histograms.items())}
+        return {'process': self.process_name, 'pid': self.pid, 'time': str(datetime.now()), 'stages': stages,
+                'gauges': gauges}
+
+    def export(self, path: str) -> None:
+        # Replaced atomically, readers never see a partial file
+        temporary_path = f'{path}.tmp'
+        with open(temporary_path, 'w') as file:
+            json.dump(self.snapshot(), file)
+        os.replace(temporary_path, path)
+
+    def start_export(self, process_name: str, directory: str = METRICS_DIRECTORY,
+                     interval: float = EXPORT_INTERVAL) -> None:
+        self.process_name = process_name
+        if self.exporter is not None:
+            return
+
+        os.makedirs(directory, exist_ok=True)
+        path = os.path.join(directory, f'{process_name}.json')
+
+        def export_periodically() -> None:
+            while True:
+                time.sleep(interval)
+                try:
+                    self.export(path)
+                except Exception as e:
+                    print(f"{str(datetime.now())} - Metrics export failed - {str(e)}")
+
+        self.exporter = threading.Thread(target=export_periodically, daemon=True)
+        self.exporter.start()
+
+
+def get_queue_depth(source: Queue) -> int:
+    try:
+        return source.qsize()
+    except NotImplementedError:  # macOS
+        return -1
+
+
+_metrics: Optional[Metrics] = None
+
+
+def get_metrics() -> Metrics:
+    # One instance per process, a forked process starts with empty histograms
+    global _metrics
+    if _metrics is None or _metrics.pid != os.getpid():
+        _metrics = Metrics()
+    return _metrics
+
+
+def read_metrics(directory: str = METRICS_DIRECTORY) -> pd.DataFrame:
+    """
+    Latency of every stage (seconds) merging the last snapshots of all the processes, and their gauges as
+    <process>#<gauge> rows in the value column.
+    """
+    histograms: Dict[str, LatencyHistogram] = {}
+    rows = []
+    for path in sorted(glob.glob(os.path.join(directory, '*.json'))):
+        with open(path) as file:
+            snapshot = json.load(file)
+        for stage, values in snapshot['stages'].items():
+            histograms.setdefault(stage, LatencyHistogram()).merge(values['buckets'], values['max_ns'])
+        for name, value in snapshot['gauges'].items():
+            rows.append({'name': f"{snapshot['process']}#{name}", 'value': value})
+
+    rows = [
+        {'name': stage, 'count': h.total, 'p50': h.percentile(50) / 1e9, 'p99': h.percentile(99) / 1e9,
+         'max': h.max / 1e9}
+        for stage, h in histograms.items()
+    ] + rows
+    return pd.DataFrame(rows, columns=['name', 'count', 'p50', 'p99', 'max', 'value']).set_index('name')
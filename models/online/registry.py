@@ -0,0 +1,67 @@
+from typing import List, Dict, Tuple, Optional, Sequence
+
+from models.asset import Asset
+from models.indicators.indicator import Indicator, IndicatorConfiguration
+
+
+class Registry:
+    """
+    Dense integer IDs for the assets, timeframes and indicator configurations, interned once at startup, and the
+    store keys of every combination precomputed so the hot paths index these tables instead of formatting keys.
+
+    Store keys:
+        assets_keys[asset] -> ASSET#<source>#<ticker>
+        bars_keys[timeframe][asset] -> <timeframe>_ASSET#<source>#<ticker>
+        indicators_keys[indicator] -> <timeframe>_INDICATOR#<source>#<ticker>#<indicator class>#<config>
+    """
+
+    def __init__(self, indicators: List[Indicator], assets: Sequence[Asset] = ()):
+        self.assets: List[Asset] = []
+        self.assets_index: Dict[str, int] = {}  # <source>#<ticker> -> ID
+        self.timeframes: List[str] = []
+        self.timeframes_index: Dict[str, int] = {}
+
+        # ID -> (indicator, config, asset ID, timeframe ID)
+        self.indicators: List[Tuple[Indicator, IndicatorConfiguration, int, int]] = []
+        # (asset ID, indicator class name, config) -> ID
+        self.indicators_index: Dict[Tuple[int, str, str], int] = {}
+
+        # Assets without indicators first (ej: every asset of the InputStore), in the given order
+        for asset in assets:
+            self.intern_asset(asset)
+
+        for indicator in indicators:
+            for indicator_config in indicator.config:
+                timeframe_id = self.intern_timeframe(indicator_config.timeframe)
+                for asset in indicator.assets:
+                    asset_id = self.intern_asset(asset)
+                    k = (asset_id, indicator.__class__.__name__, indicator_config.key)
+                    if k not in self.indicators_index.keys():
+                        self.indicators_index[k] = len(self.indicators)
+                        self.indicators.append((indicator, indicator_config, asset_id, timeframe_id))
+
+        self.assets_keys: List[str] = [f'ASSET#{asset.key}' for asset in self.assets]
+        self.bars_keys: List[List[str]] = [
+            [f'{timeframe}_{asset_key}' for asset_key in self.assets_keys] for timeframe in self.timeframes
+        ]
+        self.indicators_keys: List[str] = [
+            f'{self.timeframes[timeframe_id]}_INDICATOR#{self.assets[asset_id].key}#'
+            f'{indicator.__class__.__name__}#{indicator_config.key}'
+            for indicator, indicator_config, asset_id, timeframe_id in self.indicators
+        ]
+
+    def intern_asset(self, asset: Asset) -> int:
+        if asset.key not in self.assets_index.keys():
+            self.assets_index[asset.key] = len(self.assets)
+            self.assets.append(asset)
+        return self.assets_index[asset.key]
+
+    def intern_timeframe(self, timeframe: str) -> int:
+        if timeframe not in self.timeframes_index.keys():
+            self.timeframes_index[timeframe] = len(self.timeframes)
+            self.timeframes.append(timeframe)
+        return self.timeframes_index[timeframe]
+
+    def get_indicator_id(self, asset_id: int, indicator: Indicator,
+                         indicator_config: IndicatorConfiguration) -> Optional[int]:
+        return self.indicators_index.get((asset_id, indicator.__class__.__name__, indicator_config.key), None)
@@ -0,0 +1,195 @@
+import uuid
+from multiprocessing.shared_memory import SharedMemory
+from typing import Optional, Tuple, Dict, Sequence
+
+import numpy as np
+import pandas as pd
+
+from models.tick import TICK_COLUMNS
+
+BAR_COLUMNS = ['Open', 'High', 'Low', 'Close', 'Volume']
+
+# Header slots
+VERSION = 0  # Seqlock: odd while a writer is publishing
+COUNT = 1  # Rows appended since creation
+HEADER_SIZE = 2
+
+# Buffers created or attached in this process -> shared memory name
+_buffers: Dict[str, 'RingBuffer'] = {}
+
+
+def _attach(cls: type, name: str, columns: Sequence[str], capacity: int, index_name: str) -> 'RingBuffer':
+    # Forked processes already have the buffer mapped, other ones map the segment by name
+    if name not in _buffers:
+        buffer = cls.__new__(cls)
+        buffer._setup(columns, capacity, index_name, SharedMemory(name=name))
+        _buffers[name] = buffer
+    return _buffers[name]
+
+
+class RingBuffer:
+    """
+    Fixed capacity columnar buffer with a time index living in a shared memory segment. Once full, the oldest
+    rows are evicted.
+
+    Every row is written twice (slot i and slot i + capacity) so the last n rows are always a contiguous
+    slice of the underlying arrays and readers can get them as views without copying.
+    Only one process must write to a buffer; readers use the seqlock in the header to get consistent snapshots.
+
+    Memory: header int64[2] + times int64[2 * capacity] + values float64[2 * capacity, len(columns)]
+    """
+
+    def __init__(self, columns: Sequence[str], capacity: int, index_name: str = 'time'):
+        if capacity <= 0:
+            raise Exception(f"Capacity must be greater than 0 in {self.__class__.__name__}")
+
+        shm = SharedMemory(name=f'ot_{uuid.uuid4().hex[:16]}', create=True, size=self.nbytes(len(columns), capacity))
+        self._setup(columns, capacity, index_name, shm)
+        _buffers[self.name] = self
+
+    @staticmethod
+    def nbytes(n_columns: int, capacity: int) -> int:
+        return 8 * HEADER_SIZE + 8 * 2 * capacity + 8 * 2 * capacity * n_columns
+
+    def _setup(self, columns: Sequence[str], capacity: int, index_name: str, shm: SharedMemory) -> None:
+        self.columns = list(columns)
+        self.capacity = capacity
+        self.index_name = index_name
+        self._shm = shm
+
+        rows = 2 * capacity
+        offset = 8 * HEADER_SIZE
+        self._header = np.ndarray((HEADER_SIZE,), dtype=np.int64, buffer=shm.buf, offset=0)
+        self._times = np.ndarray((rows,), dtype=np.int64, buffer=shm.buf, offset=offset)
+        self._values = np.ndarray((rows, len(self.columns)), dtype=np.float64, buffer=shm.buf,
+                                  offset=offset + 8 * rows)
+
+    @property
+    def name(self) -> str:
+        return self._shm.name
+
+    def __reduce__(self):
+        # Pickled by reference, unpickling maps the same segment
+        return _attach, (self.__class__, self.name, self.columns, self.capacity, self.index_name)
+
+    def __len__(self) -> int:
+        return min(int(self._header[COUNT]), self.capacity)
+
+    @property
+    def count(self) -> int:
+        # Total rows appended since creation, including evicted ones
+        return int(self._header[COUNT])
+
+    @property
+    def version(self) -> int:
+        return int(self._header[VERSION])
+
+    def unlink(self) -> None:
+        _buffers.pop(self.name, None)
+        self._shm.close()
+        self._shm.unlink()
+
+    def _write(self, time: int, values: Sequence[float]) -> None:
+        count = int(self._header[COUNT])
+        slot = count % self.capacity
+
+        self._times[slot] = self._times[slot + self.capacity] = time
+        self._values[slot] = self._values[slot + self.capacity] = values
+
+        self._header[COUNT] = count + 1
+
+    def append(self, time: int, values: Sequence[float]) -> None:
+        self._header[VERSION] += 1
+        self._write(time, values)
+        self._header[VERSION] += 1
+
+    def view(self, n: Optional[int] = None) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        Returns (times, values) views of the last n rows (all rows if n is None), oldest first.
+        Views are not copied, so they change as new rows are appended.
+        """
+        count = int(self._header[COUNT])
+        length = min(count, self.capacity)
+        n = length if n is None else max(0, min(n, length))
+        if n == 0:
+            return self._times[:0], self._values[:0]
+
+        end = (count - 1) % self.capacity + self.capacity + 1
+        return self._times[end - n:end], self._values[end - n:end]
+
+    def snapshot(self, n: Optional[int] = None) -> Tuple[np.ndarray, np.ndarray, int]:
+        """
+        Returns consistent copies of the last n rows and the count they were taken at,
+        retrying while a writer is publishing.
+        """
+        while True:
+            version = int(self._header[VERSION])
+            if version & 1:
+                continue
+
+            count = int(self._header[COUNT])
+            times, values = self.view(n)
+            times, values = times.copy(), values.copy()
+
+            if int(self._header[VERSION]) == version:
+                return times, values, count
+
+    def read_into(self, times: np.ndarray, values: np.ndarray) -> Tuple[int, int]:
+        """
+        Copies the last len(times) rows (or less) into preallocated arrays, oldest first, retrying while a
+        writer is publishing. Returns the rows copied and the count they were taken at.
+        """
+        while True:
+            version = int(self._header[VERSION])
+            if version & 1:
+                continue
+
+            count = int(self._header[COUNT])
+            view_times, view_values = self.view(len(times))
+            n = len(view_times)
+            times[:n] = view_times
+            values[:n] = view_values
+
+            if int(self._header[VERSION]) == version:
+                return n, count
+
+    def column(self, name: str, n: Optional[int] = None) -> np.ndarray:
+        return self.view(n)[1][:, self.columns.index(name)]
+
+    def to_frame(self, n: Optional[int] = None) -> pd.DataFrame:
+        times, values, _ = self.snapshot(n)
+        return pd.DataFrame(
+            values,
+            columns=self.columns,
+            index=pd.DatetimeIndex(times.astype('datetime64[ns]'), name=self.index_name)
+        )
+
+
+class TickBuffer(RingBuffer):
+
+    def __init__(self, capacity: int):
+        super().__init__(columns=TICK_COLUMNS, capacity=capacity, index_name='time')
+
+
+class BarBuffer(RingBuffer):
+
+    def __init__(self, capacity: int):
+        super().__init__(columns=BAR_COLUMNS, capacity=capacity, index_name='Time')
+
+    def to_frame(self, n: Optional[int] = None) -> pd.DataFrame:
+        # Same layout as the timeframed DataFrames: Time column and bar number as index
+        times, values, count = self.snapshot(n)
+        df = pd.DataFrame(values, columns=self.columns, index=pd.RangeIndex(count - len(values), count))
+        df.insert(0, 'Time', times.astype('datetime64[ns]'))
+        return df
+
+
+class IndicatorBuffer(RingBuffer):
+
+    def __init__(self, columns: Sequence[str], capacity: int):
+        super().__init__(columns=columns, capacity=capacity, index_name='Time')
+
+    def to_frame(self, n: Optional[int] = None) -> pd.DataFrame:
+        # Same layout as the DataFrames returned by Indicator.compute(): output columns and bar number as index
+        _, values, count = self.snapshot(n)
+        return pd.DataFrame(values, columns=self.columns, index=pd.RangeIndex(count - len(values), count))
@@ -0,0 +1,74 @@
+import threading
+import time
+from typing import List, Dict, Callable
+
+from models.online.bar_builder import NS
+from models.online.metrics import get_metrics
+from models.online.ring_buffer import RingBuffer
+from models.tick import now_ns
+
+# Per bar execution record, in seconds
+EXECUTION_COLUMNS = [
+    'latency',  # From the bar boundary to the end of the execution
+    'duration',  # Of the execution
+    'missed'  # Boundaries skipped because the execution overran them
+]
+
+
+class TimeframeScheduler:
+    """
+    Runs a task on every bar boundary of every timeframe. Boundaries are multiples of the timeframe on the wall
+    clock (same as BarBuilder), so any timeframe works and they do not need to divide each other.
+    Every timeframe has its own thread, a slow execution never delays the other timeframes.
+
+    Waits are measured with the monotonic clock, re-anchored to the wall clock before every wait. An execution that
+    runs past the next boundary is reported as an overrun and the boundaries it covered are skipped, not queued.
+    Every execution is published to a shared RingBuffer per timeframe (EXECUTION_COLUMNS indexed by boundary).
+    """
+
+    def __init__(self, timeframes: List[str], close_delay: float = 0.1, capacity: int = 1000):
+        self.timeframes = list(timeframes)
+        # Time given to the InputStore listener to publish the bars of the boundary
+        self.close_delay_ns = int(close_delay * NS)
+
+        self.executions: Dict[str, RingBuffer] = {
+            timeframe: RingBuffer(columns=EXECUTION_COLUMNS, capacity=capacity, index_name='Time')
+            for timeframe in self.timeframes
+        }
+
+    def start(self, task: Callable[[str], None]) -> List[threading.Thread]:
+        threads = [
+            threading.Thread(target=self.run, args=(timeframe, task), daemon=True) for timeframe in self.timeframes
+        ]
+        for thread in threads:
+            thread.start()
+        return threads
+
+    def to_monotonic(self, wall_time: int) -> int:
+        return time.monotonic_ns() + wall_time - now_ns()
+
+    def run(self, timeframe: str, task: Callable[[str], None]) -> None:
+        tf_ns = int(timeframe) * NS
+        boundary = (now_ns() // tf_ns + 1) * tf_ns
+
+        while True:
+            deadline = self.to_monotonic(boundary) + self.close_delay_ns
+            time.sleep(max(0, deadline - time.monotonic_ns()) / NS)
+
+            started = time.monotonic_ns()
+            try:
+                task(timeframe)
+            except Exception as e:
+                print(f"Timeframe {timeframe} execution failed - {str(e)}")
+            finished = time.monotonic_ns()
+
+            # Boundaries already elapsed when the execution finished
+            next_deadline = self.to_monotonic(boundary + tf_ns) + self.close_delay_ns
+            missed = max(0, (finished - next_deadline) // tf_ns + 1)
+            if missed > 0:
+                print(f"Timeframe {timeframe} execution overran {missed} bar(s), took {(finished - started) / NS:.3f}s")
+
+            latency = finished - deadline + self.close_delay_ns
+            get_metrics().record('indicator', latency)
+            self.executions[timeframe].append(boundary, [latency / NS, (finished - started) / NS, missed])
+            boundary += (missed + 1) * tf_ns
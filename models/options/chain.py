@@ -0,0 +1,92 @@
+from datetime import date, datetime
+from typing import Iterable, Optional, Dict, Tuple, List
+
+import numpy as np
+import pandas as pd
+
+from models.options.ticker import parse_option_ticker, CALL
+
+
+class OptionChain:
+    """
+    Immutable index of an option chain, built once at startup. Series are sorted by (expiry, kind, strike) and
+    their position is their integer ID, so every (expiry, kind) is a contiguous slice sorted by strike and the
+    per series arrays can be indexed directly with the IDs.
+    """
+
+    def __init__(self, tickers: Iterable[str], reference: Optional[date] = None):
+        series = []
+        skipped = []
+        for ticker in dict.fromkeys(tickers):
+            parsed = parse_option_ticker(ticker, reference)
+            if parsed is None:
+                skipped.append(ticker)
+                continue
+            root, kind, strike, expiry = parsed
+            series.append((expiry, kind, strike, ticker, root))
+        series.sort()
+
+        self.tickers: Tuple[str, ...] = tuple(ticker for _, _, _, ticker, _ in series)
+        self.skipped: Tuple[str, ...] = tuple(skipped)  # Tickers that are not options
+        self._ids: Dict[str, int] = {ticker: i for i, ticker in enumerate(self.tickers)}
+
+        self.roots = self.read_only(np.array([root for _, _, _, _, root in series], dtype=object))
+        self.strikes = self.read_only(np.array([strike for _, _, strike, _, _ in series], dtype=np.float64))
+        self.is_call = self.read_only(np.array([kind == CALL for _, kind, _, _, _ in series], dtype=bool))
+        self.expiries = self.read_only(np.array(
+            [np.datetime64(expiry, 'ns').astype(np.int64) for expiry, _, _, _, _ in series], dtype=np.int64
+        ))
+
+        # (expiry, kind) -> IDs slice
+        self._series: Dict[Tuple[datetime, str], slice] = {}
+        for i, (expiry, kind, _, _, _) in enumerate(series):
+            start = self._series[(expiry, kind)].start if (expiry, kind) in self._series else i
+            self._series[(expiry, kind)] = slice(start, i + 1)
+
+        self.expirations: Tuple[datetime, ...] = tuple(dict.fromkeys(expiry for expiry, _ in self._series))
+
+    @staticmethod
+    def read_only(array: np.ndarray) -> np.ndarray:
+        array.setflags(write=False)
+        return array
+
+    @classmethod
+    def from_metadata(cls, df: pd.DataFrame, reference: Optional[date] = None) -> 'OptionChain':
+        # Rows of the cotizaciones/opciones endpoint (METADATA-OPTIONS-GGAL), the ticker is the 'id' column
+        return cls(df['id'].astype(str), reference)
+
+    @classmethod
+    def from_snapshot(cls, path: str, reference: Optional[date] = None) -> 'OptionChain':
+        df = pd.read_parquet(path, columns=['id']) if path.endswith('.parquet') else pd.read_csv(path, usecols=['id'])
+        return cls.from_metadata(df, reference)
+
+    def __len__(self) -> int:
+        return len(self.tickers)
+
+    def __contains__(self, ticker: str) -> bool:
+        return ticker in self._ids
+
+    def get_id(self, ticker: str) -> int:
+        return self._ids[ticker]
+
+    def get_ids(self, tickers: Iterable[str]) -> np.ndarray:
+        return np.fromiter((self._ids[ticker] for ticker in tickers), dtype=np.int64)
+
+    def series(self, expiry: datetime, kind: str = CALL) -> slice:
+        # IDs of one expiry and kind, sorted by strike
+        return self._series.get((expiry, kind), slice(0, 0))
+
+    def series_keys(self) -> List[Tuple[datetime, str]]:
+        return list(self._series.keys())
+
+    def describe(self, ticker: str) -> Dict[str, object]:
+        i = self._ids[ticker]
+        return {
+            'id': i,
+            'ticker': ticker,
+            'root': self.roots[i],
+            'kind': 'C' if self.is_call[i] else 'V',
+            'strike': float(self.strikes[i]),
+            'expiry': pd.Timestamp(int(self.expiries[i])).to_pydatetime()
+        }
+
@@ -0,0 +1,110 @@
+from typing import Dict
+
+import numpy as np
+
+SECONDS_PER_YEAR = 365 * 24 * 3600
+MIN_VOL, MAX_VOL = 1e-4, 5.0
+
+
+def erfc(x: np.ndarray) -> np.ndarray:
+    # Chebyshev approximation, fractional error below 1.2e-7 (Numerical Recipes erfcc)
+    z = np.abs(x)
+    t = 1 / (1 + 0.5 * z)
+    r = t * np.exp(-z * z - 1.26551223 + t * (1.00002368 + t * (0.37409196 + t * (0.09678418 + t * (
+        -0.18628806 + t * (0.27886807 + t * (-1.13520398 + t * (1.48851587 + t * (-0.82215223 + t * 0.17087277)))))))))
+    return np.where(x >= 0, r, 2 - r)
+
+
+def norm_cdf(x: np.ndarray) -> np.ndarray:
+    return 0.5 * erfc(-x / np.sqrt(2))
+
+
+def norm_pdf(x: np.ndarray) -> np.ndarray:
+    return np.exp(-0.5 * x * x) / np.sqrt(2 * np.pi)
+
+
+def d1_d2(spot, strike, t, rate, vol):
+    vol_t = vol * np.sqrt(t)
+    d1 = (np.log(spot / strike) + (rate + 0.5 * vol * vol) * t) / vol_t
+    return d1, d1 - vol_t
+
+
+def price(spot, strike, t, rate, vol, is_call) -> np.ndarray:
+    """
+    Black-Scholes price. Every argument broadcasts, t in years and is_call a boolean array.
+    """
+    d1, d2 = d1_d2(spot, strike, t, rate, vol)
+    discount = strike * np.exp(-rate * t)
+    call = spot * norm_cdf(d1) - discount * norm_cdf(d2)
+    return np.where(is_call, call, call - spot + discount)  # Put from the put-call parity
+
+
+def greeks(spot, strike, t, rate, vol, is_call) -> Dict[str, np.ndarray]:
+    d1, d2 = d1_d2(spot, strike, t, rate, vol)
+    sqrt_t = np.sqrt(t)
+    pdf = norm_pdf(d1)
+    call_delta = norm_cdf(d1)
+
+    return {
+        'delta': np.where(is_call, call_delta, call_delta - 1),
+        'gamma': pdf / (spot * vol * sqrt_t),
+        'vega': spot * pdf * sqrt_t  # Per 1.00 of volatility
+    }
+
+
+def implied_vol(market_price, spot, strike, t, rate, is_call, tol: float = 1e-6, max_iter: int = 50) -> np.ndarray:
+    """
+    Vectorized implied volatility: Newton steps, falling back to bisection when the step leaves the bracket
+    [MIN_VOL, MAX_VOL] or vega is too small. NaN for prices outside the no-arbitrage bounds.
+    """
+    market_price, spot, strike, t, rate, is_call = np.broadcast_arrays(
+        *[np.asarray(a, dtype=np.float64) if i < 5 else np.asarray(a, dtype=bool)
+          for i, a in enumerate([market_price, spot, strike, t, rate, is_call])]
+    )
+
+    discount = strike * np.exp(-rate * t)
+    lower_bound = np.where(is_call, np.maximum(spot - discount, 0), np.maximum(discount - spot, 0))
+    upper_bound = np.where(is_call, spot, discount)
+    valid = (t > 0) & (market_price > lower_bound) & (market_price < upper_bound)
+
+    low = np.full(market_price.shape, MIN_VOL)
+    high = np.full(market_price.shape, MAX_VOL)
+    vol = np.full(market_price.shape, 0.5)
+    active = valid.copy()
+
+    # Invalid nodes are priced with dummy inputs so they do not produce warnings
+    safe_t = np.where(valid, t, 1.0)
+    for _ in range(max_iter):
+        if not active.any():
+            break
+
+        diff = price(spot, strike, safe_t, rate, vol, is_call) - market_price
+        vega = greeks(spot, strike, safe_t, rate, vol, is_call)['vega']
+
+        # The price increases with the volatility
+        high = np.where(active & (diff > 0), vol, high)
+        low = np.where(active & (diff <= 0), vol, low)
+
+        with np.errstate(divide='ignore', invalid='ignore'):
+            newton = vol - diff / vega
+        bisection = 0.5 * (low + high)
+        use_newton = (vega > 1e-8) & (newton > low) & (newton < high)
+        new_vol = np.where(use_newton, newton, bisection)
+
+        active = active & (np.abs(diff) > tol) & (np.abs(new_vol - vol) > tol * 1e-3)
+        vol = np.where(active, new_vol, vol)
+
+    return np.where(valid, vol, np.nan)
+
+
+def price_chain(spot: float, strikes: np.ndarray, t: np.ndarray, is_call: np.ndarray, market_prices: np.ndarray,
+                rate: float) -> Dict[str, np.ndarray]:
+    """
+    Implied volatility and greeks of every series of a chain in one call.
+    """
+    vol = implied_vol(market_prices, spot, strikes, t, rate, is_call)
+    safe_vol = np.where(np.isnan(vol), 1.0, vol)
+    safe_t = np.where(t > 0, t, 1.0)
+
+    chain_greeks = greeks(spot, strikes, safe_t, rate, safe_vol, is_call)
+    return {'iv': vol, **{name: np.where(np.isnan(vol), np.nan, value) for name, value in chain_greeks.items()}}
@@ -0,0 +1,130 @@
+from typing import List, Dict, Any
+
+import numpy as np
+
+from models.asset import Asset
+from models.options.surface import VolatilitySurface, SURFACE_FIELDS, PRICE, DELTA, GAMMA, VEGA
+
+RISK_FIELDS = ['pnl', 'delta', 'gamma', 'vega', 'exposure']
+PNL, NET_DELTA, NET_GAMMA, NET_VEGA, EXPOSURE = range(len(RISK_FIELDS))
+
+
+class PortfolioRisk:
+    """
+    Mark-to-market PnL, net greeks and delta exposure of the open lots of a Portfolio, kept in arrays aligned with
+    the nodes of a VolatilitySurface (its OptionChain IDs) plus the underlying.
+
+    Contributions are cached per node and only recomputed, in one vectorized pass, for the nodes whose marks or
+    positions changed since the last update: an option tick touches its node, an underlying tick every node.
+
+        pnl: quantity * price - cost
+        delta, gamma, vega: quantity * greek * multiplier (underlying delta = quantity)
+        exposure: delta * spot
+    """
+
+    def __init__(self, surface: VolatilitySurface, underlying: Asset, options: List[Asset], multiplier: float = 1.0):
+        self.surface = surface
+        self.multiplier = multiplier  # Shares per option quantity, Portfolio.buy() charges price * quantity
+
+        # Portfolio identifier -> node
+        tickers_ids = {ticker: i for i, ticker in enumerate(surface.chain.tickers)}
+        self.nodes_index: Dict[str, int] = {
+            asset.identifier: tickers_ids[asset.ticker] for asset in options if asset.ticker in tickers_ids.keys()
+        }
+        self.underlying_identifier = underlying.identifier
+        # Identifiers synced from the portfolio: the options held in the chain, then the underlying
+        self.identifiers = list(self.nodes_index.keys()) + [self.underlying_identifier]
+        self.identifiers_nodes = np.fromiter(self.nodes_index.values(), dtype=np.int64, count=len(self.nodes_index))
+
+        # Expiry of every node -> bucket
+        self.expiries, self.nodes_expiry = np.unique(surface.expiries, return_inverse=True)
+
+        n = len(surface.chain)
+        self.quantities = np.zeros(n)
+        self.costs = np.zeros(n)
+        self.marks = np.full((n, len(SURFACE_FIELDS)), np.nan)
+        self.contributions = np.zeros((n, len(RISK_FIELDS)))
+        self.expiries_risk = np.zeros((len(self.expiries), len(RISK_FIELDS)))
+        self.dirty = np.zeros(n, dtype=bool)
+
+        self.underlying_quantity = 0
+        self.underlying_cost = 0.0
+        self.spot = np.nan
+        self.version = -1  # Surface version of the marks
+
+    def sync_positions(self, portfolio: Any) -> None:
+        # Reads the running totals of the portfolio positions, only the changed nodes are invalidated
+        positions_quantities, positions_costs = portfolio.get_positions(self.identifiers)
+        quantities = np.zeros(len(self.quantities))
+        costs = np.zeros(len(self.costs))
+        quantities[self.identifiers_nodes] = positions_quantities[:-1]
+        costs[self.identifiers_nodes] = positions_costs[:-1]
+
+        self.dirty |= (quantities != self.quantities) | (costs != self.costs)
+        self.quantities, self.costs = quantities, costs
+        self.underlying_quantity = positions_quantities[-1]
+        self.underlying_cost = positions_costs[-1]
+
+    def sync_marks(self) -> None:
+        version, nodes, spot = self.surface.snapshot()
+        if version == self.version or len(nodes) == 0:
+            return
+
+        if spot != self.spot:
+            # Exposure depends on the spot, every node is invalidated
+            self.spot = spot
+            self.dirty[:] = True
+
+        # NaN aware comparison, nodes without changes keep their cached contributions
+        changed = ~((nodes == self.marks) | (np.isnan(nodes) & np.isnan(self.marks))).all(axis=1)
+        self.dirty |= changed
+        self.marks[changed] = nodes[changed]
+        self.version = version
+
+    def recompute(self) -> None:
+        nodes = np.flatnonzero(self.dirty)
+        if len(nodes) == 0:
+            return
+
+        quantities = self.quantities[nodes]
+        held = quantities != 0
+        marks = self.marks[nodes]
+
+        contributions = np.zeros((len(nodes), len(RISK_FIELDS)))
+        # Nodes without position contribute 0 even if they are not priced yet
+        contributions[:, PNL] = np.where(held, quantities * marks[:, PRICE] - self.costs[nodes], 0)
+        for field, column in [(NET_DELTA, DELTA), (NET_GAMMA, GAMMA), (NET_VEGA, VEGA)]:
+            contributions[:, field] = np.where(held, quantities * marks[:, column] * self.multiplier, 0)
+        contributions[:, EXPOSURE] = contributions[:, NET_DELTA] * self.spot
+
+        if len(nodes) == len(self.dirty):
+            # Full pass, rebuilt from scratch so the incremental updates never accumulate rounding errors
+            self.expiries_risk[:] = 0
+            np.add.at(self.expiries_risk, self.nodes_expiry, contributions)
+        else:
+            np.add.at(self.expiries_risk, self.nodes_expiry[nodes], contributions - self.contributions[nodes])
+        self.contributions[nodes] = contributions
+        self.dirty[nodes] = False
+
+    def update(self, portfolio: Any) -> Dict[str, Any]:
+        """
+        Returns the risk of the portfolio with the last surface: totals, underlying and options risk per expiry.
+        """
+        self.sync_positions(portfolio)
+        self.sync_marks()
+        self.recompute()
+
+        underlying = np.zeros(len(RISK_FIELDS))
+        underlying[PNL] = self.underlying_quantity * self.spot - self.underlying_cost if self.underlying_quantity else 0
+        underlying[NET_DELTA] = self.underlying_quantity
+        underlying[EXPOSURE] = self.underlying_quantity * self.spot if self.underlying_quantity else 0
+
+        totals = self.expiries_risk.sum(axis=0) + underlying
+        return {
+            **{field: float(totals[i]) for i, field in enumerate(RISK_FIELDS)},
+            'underlying': {field: float(underlying[i]) for i, field in enumerate(RISK_FIELDS)},
+            'expiries': {
+                str(expiry.astype('datetime64[ns]')): {field: float(risk[i]) for i, field in enumerate(RISK_FIELDS)}
+                for expiry, risk in zip(self.expiries, self.expiries_risk)
+            }
+        }
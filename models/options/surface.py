@@ -0,0 +1,164 @@
+import math
+from datetime import date, datetime
+from typing import List, Dict, Tuple, Optional
+
+import numpy as np
+
+from models.asset import Asset
+from models.online.ring_buffer import RingBuffer
+from models.options.chain import OptionChain
+from models.options.pricing import SECONDS_PER_YEAR, implied_vol, greeks
+from models.options.ticker import CALL
+from models.tick import Tick, TICK_COLUMNS, LAST_PRICE
+
+SURFACE_FIELDS = ['price', 'iv', 'delta', 'gamma', 'vega']
+PRICE, IV, DELTA, GAMMA, VEGA = range(len(SURFACE_FIELDS))
+
+BID = TICK_COLUMNS.index('box_buy_price_1')
+ASK = TICK_COLUMNS.index('box_sell_price_1')
+
+
+class VolatilitySurface:
+    """
+    Implied volatility and greeks of every option of a chain, kept in shared memory and updated by the process
+    feeding the ticks (the InputStore listener): an option tick recomputes only its node and an underlying tick
+    recomputes the whole chain in one vectorized call.
+
+    Nodes follow the OptionChain IDs, so every smile is a contiguous slice sorted by strike.
+    Every update publishes a new row of SURFACE_FIELDS per node to a RingBuffer; readers get the last row as a
+    view (snapshot()), which is not overwritten until capacity - 1 more updates are published.
+    """
+
+    def __init__(self, underlying: Asset, options: List[Asset], rate: float, capacity: int = 64,
+                 reference: Optional[date] = None):
+        self.underlying = underlying
+        self.underlying_id = f'ASSET#{str(underlying)}'
+        self.rate = rate  # Annual, continuously compounded
+
+        # Nodes are the chain IDs
+        assets_ids = {asset.ticker: f'ASSET#{str(asset)}' for asset in options}
+        self.chain = OptionChain(assets_ids.keys(), reference)
+        if len(self.chain.skipped) > 0:
+            raise Exception(f"{', '.join(self.chain.skipped)} are not option tickers in {self.__class__.__name__}")
+
+        self.assets_ids = [assets_ids[ticker] for ticker in self.chain.tickers]
+        self.nodes_index: Dict[str, int] = {asset_id: i for i, asset_id in enumerate(self.assets_ids)}
+        self.strikes, self.is_call, self.expiries = self.chain.strikes, self.chain.is_call, self.chain.expiries
+
+        self.buffer = RingBuffer(
+            columns=[f'{asset_id}#{field}' for asset_id in self.assets_ids for field in SURFACE_FIELDS] + ['spot'],
+            capacity=capacity
+        )
+
+        # Writer state, only meaningful in the process calling update(): the published row and its nodes view
+        self.spot = math.nan
+        self.option_prices = np.full(len(self.chain), np.nan)
+        self.row = np.full(len(self.chain) * len(SURFACE_FIELDS) + 1, np.nan)
+        self.nodes = self.row[:-1].reshape(len(self.chain), len(SURFACE_FIELDS))
+
+    @staticmethod
+    def get_option_price(tick: Tick) -> float:
+        # Mid price when both sides are quoted, last price otherwise
+        bid, ask = tick.values[BID], tick.values[ASK]
+        if not math.isnan(bid) and not math.isnan(ask) and bid > 0 and ask >= bid:
+            return (bid + ask) / 2
+        return tick.values[LAST_PRICE]
+
+    def recompute(self, nodes, time: int) -> None:
+        t = (self.expiries[nodes] - time) / 1e9 / SECONDS_PER_YEAR
+        strikes, is_call, prices = self.strikes[nodes], self.is_call[nodes], self.option_prices[nodes]
+
+        vol = implied_vol(prices, self.spot, strikes, t, self.rate, is_call)
+        valid = ~np.isnan(vol)
+        nodes_greeks = greeks(
+            self.spot, strikes, np.where(valid, t, 1.0), self.rate, np.where(valid, vol, 1.0), is_call
+        )
+
+        self.nodes[nodes, PRICE] = prices
+        self.nodes[nodes, IV] = vol
+        for field, column in [('delta', DELTA), ('gamma', GAMMA), ('vega', VEGA)]:
+            self.nodes[nodes, column] = np.where(valid, nodes_greeks[field], np.nan)
+
+    def update(self, asset_id: str, tick: Tick) -> bool:
+        # Returns True if the tick changed the surface
+        if asset_id == self.underlying_id:
+            if math.isnan(tick.last_price):
+                return False
+            self.spot = tick.last_price
+            nodes = slice(None)
+        elif asset_id in self.nodes_index.keys():
+            node = self.nodes_index[asset_id]
+            self.option_prices[node] = self.get_option_price(tick)
+            nodes = slice(node, node + 1)
+        else:
+            return False
+
+        if math.isnan(self.spot):
+            return False
+
+        self.recompute(nodes, tick.time)
+        self.row[-1] = self.spot
+        self.buffer.append(tick.time, self.row)
+        return True
+
+    @property
+    def version(self) -> int:
+        # Updates published since creation
+        return self.buffer.count
+
+    def snapshot(self) -> Tuple[int, np.ndarray, float]:
+        """
+        Returns (version, nodes x SURFACE_FIELDS view, spot) of the last published surface. The view is not copied,
+        is_current(version) tells whether a newer surface was published since.
+        """
+        while True:
+            version = self.buffer.version
+            if version & 1:
+                continue
+            count = self.buffer.count
+            _, values = self.buffer.view(1)
+            if self.buffer.version == version:
+                if len(values) == 0:
+                    return count, self.nodes[:0], math.nan
+                return count, values[0][:-1].reshape(len(self.assets_ids), len(SURFACE_FIELDS)), float(values[0][-1])
+
+    def is_current(self, version: int) -> bool:
+        return self.buffer.count == version
+
+    def smile(self, expiry: datetime, kind: str = CALL) -> Tuple[np.ndarray, np.ndarray]:
+        # (strikes, implied volatilities) of one expiry, sorted by strike
+        nodes = self.chain.series(expiry, kind)
+        _, values, _ = self.snapshot()
+        if len(values) == 0:
+            return self.strikes[nodes], np.full(nodes.stop - nodes.start, np.nan)
+        return self.strikes[nodes], values[nodes, IV]
+
+    def get_iv(self, expiry: datetime, strike: float, kind: str = CALL) -> float:
+        """
+        Implied volatility at any strike of the expiry, linearly interpolated between the closest nodes with a
+        valid volatility (flat beyond the first and last ones). O(log n) on the number of strikes.
+        """
+        strikes, ivs = self.smile(expiry, kind)
+        position = int(np.searchsorted(strikes, strike))
+
+        left = position - 1
+        while left >= 0 and math.isnan(ivs[left]):
+            left -= 1
+        right = position
+        while right < len(strikes) and math.isnan(ivs[right]):
+            right += 1
+
+        if left < 0 and right >= len(strikes):
+            return math.nan
+        if left < 0:
+            return float(ivs[right])
+        if right >= len(strikes):
+            return float(ivs[left])
+        if strikes[right] == strikes[left]:
+            return float(ivs[right])
+
+        weight = (strike - strikes[left]) / (strikes[right] - strikes[left])
+        return float(ivs[left] + weight * (ivs[right] - ivs[left]))
+
+    def unlink(self) -> None:
+        self.buffer.unlink()
@@ -0,0 +1,53 @@
+import re
+from datetime import date, datetime, timedelta
+from typing import Optional, Tuple
+
+# <underlying root><C=call|V=put><strike digits><expiry month code> -> Ej: GFGC41617G, GFGV3300OC
+OPTION_TICKER = re.compile(r'^(?P<root>[A-Z]{3})(?P<kind>[CV])(?P<strike>\d+)(?P<month>[A-Z]{1,2})$')
+
+MONTH_CODES = {
+    'EN': 1, 'FE': 2, 'MR': 3, 'AB': 4, 'MY': 5, 'JN': 6, 'JU': 6, 'JL': 7, 'AG': 8, 'SE': 9, 'OC': 10, 'NO': 11,
+    'DI': 12,
+    # Single letter codes, GGAL series expire on even months
+    'F': 2, 'A': 4, 'J': 6, 'G': 8, 'O': 10, 'D': 12
+}
+EXPIRY_HOUR = 17  # Local time of the expiration
+
+CALL, PUT = 'C', 'V'
+
+
+def parse_strike(digits: str) -> float:
+    # Five digit strikes carry one decimal (strikes adjusted by dividends), Ej: 41617 -> 4161.7
+    if len(digits) == 5:
+        return int(digits) / 10
+    return float(digits)
+
+
+def third_friday(year: int, month: int) -> date:
+    first = date(year, month, 1)
+    return first + timedelta(days=(4 - first.weekday()) % 7 + 14)
+
+
+def get_expiry(month: int, reference: date) -> datetime:
+    # First third Friday of the month not before the reference date
+    year = reference.year
+    if third_friday(year, month) < reference:
+        year += 1
+    return datetime.combine(third_friday(year, month), datetime.min.time()).replace(hour=EXPIRY_HOUR)
+
+
+def parse_option_ticker(ticker: str, reference: Optional[date] = None) -> Optional[Tuple[str, str, float, datetime]]:
+    """
+    Returns (root, kind, strike, expiry) or None if the ticker is not an option.
+    """
+    match = OPTION_TICKER.match(ticker)
+    if match is None or match.group('month') not in MONTH_CODES.keys():
+        return None
+
+    reference = reference if reference is not None else datetime.now().date()
+    return (
+        match.group('root'),
+        match.group('kind'),
+        parse_strike(match.group('strike')),
+        get_expiry(MONTH_CODES[match.group('month')], reference)
+    )
@@ -0,0 +1,89 @@
+import numpy as np
+
+from models.tick import TICK_COLUMNS
+
+LEVELS = 7
+BIDS, ASKS = 0, 1
+PRICE, QUANTITY = 0, 1
+# Position in TICK_COLUMNS of every book value: side x level x (price, quantity)
+BOOK_INDEX = np.array([
+    [[TICK_COLUMNS.index(f'box_{side}_{field}_{level}') for field in ['price', 'quantity']]
+     for level in range(1, LEVELS + 1)]
+    for side in ['buy', 'sell']
+])
+
+
+class OrderBook:
+    """
+    Level 2 book of one asset, the 7 box levels of its ticks kept in one (side, level, price/quantity) array that
+    is updated in place. Every tick carries the whole box, a level without price or quantity is empty.
+    Updates equal to the current book are skipped (version only changes when the book does) and every query is
+    O(levels).
+    """
+
+    def __init__(self):
+        self.book = np.full((2, LEVELS, 2), np.nan)
+        self.incoming = np.empty((2, LEVELS, 2))
+        self.version = 0
+        # Non empty levels of every side, best first, and their cumulative quantities: rebuilt when the book changes
+        self.sides = [np.empty((0, 2)), np.empty((0, 2))]
+        self.cumulative = [np.empty(0), np.empty(0)]
+
+    def update(self, values) -> bool:
+        # values: one tick row in TICK_COLUMNS order. Returns False when the book did not change
+        np.take(np.asarray(values, dtype=np.float64), BOOK_INDEX, out=self.incoming)
+        # Bitwise comparison, missing values are the same NaN
+        if self.incoming.tobytes() == self.book.tobytes():
+            return False
+        self.book[:] = self.incoming
+        self.version += 1
+        for side in (BIDS, ASKS):
+            levels = self.book[side]
+            self.sides[side] = levels[~np.isnan(levels[:, PRICE]) & (levels[:, QUANTITY] > 0)]
+            self.cumulative[side] = np.cumsum(self.sides[side][:, QUANTITY])
+        return True
+
+    def levels(self, side: int) -> np.ndarray:
+        # (price, quantity) of the non empty levels of a side, best first
+        return self.sides[side]
+
+    def best(self, side: int) -> float:
+        levels = self.levels(side)
+        return float(levels[0, PRICE]) if len(levels) > 0 else np.nan
+
+    def spread(self) -> float:
+        return self.best(ASKS) - self.best(BIDS)
+
+    def mid(self) -> float:
+        return (self.best(ASKS) + self.best(BIDS)) / 2
+
+    def microprice(self) -> float:
+        # Mid weighted by the opposite top of book quantity, leans towards the side that is about to be consumed
+        bids, asks = self.levels(BIDS), self.levels(ASKS)
+        if len(bids) == 0 or len(asks) == 0:
+            return np.nan
+        (bid, bid_quantity), (ask, ask_quantity) = bids[0], asks[0]
+        return float((bid * ask_quantity + ask * bid_quantity) / (bid_quantity + ask_quantity))
+
+    def depth(self, side: int, levels: int = LEVELS) -> float:
+        cumulative = self.cumulative[side]
+        return float(cumulative[min(levels, len(cumulative)) - 1]) if len(cumulative) > 0 and levels > 0 else 0.0
+
+    def imbalance(self, levels: int = LEVELS) -> float:
+        # (bid depth - ask depth) / total depth of the first levels, in [-1, 1]
+        bid_depth, ask_depth = self.depth(BIDS, levels), self.depth(ASKS, levels)
+        total = bid_depth + ask_depth
+        return (bid_depth - ask_depth) / total if total > 0 else np.nan
+
+    def vwap(self, side: int, size: float) -> float:
+        """
+        Average price of taking size from a side of the book (ASKS to buy, BIDS to sell), NaN if the visible
+        depth is not enough.
+        """
+        levels, cumulative = self.sides[side], self.cumulative[side]
+        if size <= 0 or len(levels) == 0 or cumulative[-1] < size:
+            return np.nan
+        last = int(np.searchsorted(cumulative, size))
+        taken = levels[:last + 1, QUANTITY].copy()
+        taken[last] -= cumulative[last] - size
+        return float(np.dot(taken, levels[:last + 1, PRICE]) / size)
@@ -0,0 +1,305 @@
+import json
+import queue
+import threading
+import time
+import uuid
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+from typing import List, Dict, Any, Optional, Tuple, Sequence
+
+import numpy as np
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+
+from models.online.metrics import get_metrics
+
+BUY, SELL = 'BUY', 'SELL'
+# Order status
+PENDING, ACKED, PARTIALLY_FILLED, FILLED, REJECTED, CANCELLED = (
+    'PENDING', 'ACKED', 'PARTIALLY_FILLED', 'FILLED', 'REJECTED', 'CANCELLED'
+)
+FINAL_STATUS = {FILLED, REJECTED, CANCELLED}
+
+
+class Order:
+    __slots__ = ('client_id', 'identifier', 'side', 'price', 'quantity', 'status', 'broker_id', 'filled_quantity',
+                 'avg_price', 'submitted', 'sent', 'acked', 'polled')
+
+    def __init__(self, client_id: str, identifier: str, side: str, price: float, quantity: int):
+        self.client_id = client_id
+        self.identifier = identifier
+        self.side = side
+        self.price = price
+        self.quantity = quantity
+        self.status = PENDING
+        self.broker_id: Optional[str] = None
+        self.filled_quantity = 0
+        self.avg_price = float('nan')  # Of the filled quantity
+        self.submitted = 0  # Monotonic ns
+        self.sent = 0  # When its request finished, from then on it is polled until it reaches a final status
+        self.acked = 0
+        self.polled = 0  # Last status request
+
+    def to_payload(self) -> Dict[str, Any]:
+        return {'client_id': self.client_id, 'identifier': self.identifier, 'side': self.side, 'price': self.price,
+                'quantity': self.quantity}
+
+    def copy(self) -> 'Order':
+        order = Order(self.client_id, self.identifier, self.side, self.price, self.quantity)
+        for slot in self.__slots__:
+            setattr(order, slot, getattr(self, slot))
+        return order
+
+
+class RateLimiter:
+    """ Token bucket: up to rate requests per second, bursts of up to burst requests. """
+
+    def __init__(self, rate: float, burst: int):
+        self.rate = rate
+        self.burst = burst
+        self.tokens = float(burst)
+        self.updated = time.monotonic()
+        self.lock = threading.Lock()
+
+    def acquire(self) -> float:
+        # Blocks until a request can be sent, returns the seconds waited
+        waited = 0.0
+        while True:
+            with self.lock:
+                now = time.monotonic()
+                self.tokens = min(self.burst, self.tokens + (now - self.updated) * self.rate)
+                self.updated = now
+                if self.tokens >= 1:
+                    self.tokens -= 1
+                    return waited
+                wait = (1 - self.tokens) / self.rate
+            time.sleep(wait)
+            waited += wait
+
+
+class OrderGateway:
+    """
+    Non-blocking order submission. submit() and submit_batch() only queue the orders; a sender thread drains the
+    queue, merging everything pending (orders and cancels) into one request, and sends it through a pooled
+    keep-alive session under a client side rate limit. Sent orders are polled until they reach a final status, so
+    the orders of a request without a definite answer (timeout, server error) or missing from its response are
+    settled by their client ID, never assumed rejected. Polling has its own smaller rate limit: pending orders are
+    polled every poll_interval, resting ones (acked, partially filled) only every resting_poll_interval to get
+    their fills, so they never use the budget of submits and cancels.
+    Every status change is queued as a copy of the order, the owner drains them with get_updates().
+
+    Order API (base_url):
+        POST /orders          {client_id, identifier, side, price, quantity}
+        POST /orders/batch    {'cancel': [client_id], 'orders': [{...}]} -> {'orders': [...]}
+        GET  /orders/<client_id>
+    Every order response: {client_id, id, status, filled_quantity, avg_price}
+    """
+
+    def __init__(self, base_url: str, headers: Optional[Dict[str, str]] = None, pool_size: int = 4,
+                 rate: float = 10, burst: int = 10, timeout: float = 5, poll_interval: float = 1.0,
+                 poll_rate: float = 2, resting_poll_interval: float = 10.0, latencies_size: int = 10000):
+        self.base_url = base_url.rstrip('/')
+        self.timeout = timeout
+        self.poll_interval = poll_interval
+        self.resting_poll_interval = resting_poll_interval
+        self.prefix = uuid.uuid4().hex[:8]  # Client IDs must be unique among processes
+        self.next_id = 0
+
+        # Keep-alive connections, only the idempotent GETs are retried
+        self.session = requests.Session()
+        self.session.headers.update(headers or {})
+        adapter = HTTPAdapter(
+            pool_connections=pool_size,
+            pool_maxsize=pool_size,
+            max_retries=Retry(total=2, backoff_factor=0.2, status_forcelist=[429, 500, 502, 503, 504],
+                              allowed_methods=['GET'])
+        )
+        self.session.mount('https://', adapter)
+        self.session.mount('http://', adapter)
+
+        self.limiter = RateLimiter(rate, burst)
+        self.poll_limiter = RateLimiter(poll_rate, max(1, int(poll_rate)))
+        self.executor = ThreadPoolExecutor(max_workers=pool_size)
+        self.requests: queue.Queue = queue.Queue()  # (orders, cancels), None stops the sender
+        self.updates: queue.Queue = queue.Queue()
+        self.orders: Dict[str, Order] = {}  # client_id -> order
+        self.lock = threading.Lock()
+        self.latencies: deque = deque(maxlen=latencies_size)  # Submit to ack, seconds
+        self.running = True
+
+        metrics = get_metrics()
+        metrics.add_gauge('order_queue_depth', self.requests.qsize)
+        metrics.add_gauge('open_orders', lambda: len(self.orders))
+
+        self.threads = [
+            threading.Thread(target=self.send, daemon=True),
+            threading.Thread(target=self.poll, daemon=True)
+        ]
+        for thread in self.threads:
+            thread.start()
+
+    def new_order(self, identifier: str, side: str, price: float, quantity: int) -> Order:
+        with self.lock:
+            client_id = f'{self.prefix}-{self.next_id}'
+            self.next_id += 1
+            order = Order(client_id, identifier, side, price, quantity)
+            self.orders[client_id] = order
+        return order
+
+    def submit(self, identifier: str, side: str, price: float, quantity: int) -> str:
+        return self.submit_batch([(identifier, side, price, quantity)])[0]
+
+    def submit_batch(self, legs: Sequence[Tuple[str, str, float, int]], cancel: Sequence[str] = ()) -> List[str]:
+        """
+        Queues the legs (identifier, side, price, quantity) of a multi-leg order, and the client IDs to cancel
+        when it is a replace, so they are sent together. Returns the client IDs of the legs.
+        """
+        orders = [self.new_order(*leg) for leg in legs]
+        submitted = time.monotonic_ns()
+        for order in orders:
+            order.submitted = submitted
+        self.requests.put((orders, list(cancel)))
+        return [order.client_id for order in orders]
+
+    def cancel(self, client_ids: Sequence[str]) -> None:
+        self.requests.put(([], list(client_ids)))
+
+    def send(self) -> None:
+        while True:
+            pending = [self.requests.get()]
+            while True:
+                try:
+                    pending.append(self.requests.get_nowait())
+                except queue.Empty:
+                    break
+
+            stop = None in pending
+            orders = [order for request in pending if request is not None for order in request[0]]
+            cancels = [client_id for request in pending if request is not None for client_id in request[1]]
+
+            if len(orders) > 0 or len(cancels) > 0:
+                self.limiter.acquire()
+                self.executor.submit(self.post, orders, cancels)
+            if stop:
+                break
+
+    def post(self, orders: List[Order], cancels: List[str]) -> None:
+        single = len(orders) == 1 and len(cancels) == 0
+        summary = f'{len(orders)} orders and {len(cancels)} cancels'
+        try:
+            if single:
+                r = self.session.post(f'{self.base_url}/orders', json=orders[0].to_payload(), timeout=self.timeout)
+            else:
+                r = self.session.post(
+                    f'{self.base_url}/orders/batch',
+                    json={'cancel': cancels, 'orders': [order.to_payload() for order in orders]},
+                    timeout=self.timeout
+                )
+        except requests.RequestException as e:
+            # The API may have taken the orders anyway (ej: timeout), polling settles them
+            print(f"{str(datetime.now())} - Unknown result of {summary} - {str(e)}")
+            self.mark_sent(orders)
+            return
+
+        if 400 <= r.status_code < 500 and r.status_code != 429:
+            # Refused request, none of its orders were taken
+            print(f"{str(datetime.now())} - Error {r.status_code} when sending {summary}")
+            for order in orders:
+                self.update(order, {'status': REJECTED})
+            return
+
+        self.mark_sent(orders)
+        try:
+            if r.status_code != 200:
+                raise Exception(f'Error {r.status_code}')
+            responses = [json.loads(r.content)] if single else json.loads(r.content)['orders']
+        except Exception as e:
+            print(f"{str(datetime.now())} - Unknown result of {summary} - {str(e)}")
+            return
+
+        for response in responses:
+            order = self.orders.get(response.get('client_id'))
+            if order is not None:
+                self.update(order, response)
+
+    def mark_sent(self, orders: List[Order]) -> None:
+        sent = time.monotonic_ns()
+        with self.lock:
+            for order in orders:
+                order.sent = sent
+
+    def update(self, order: Order, response: Dict[str, Any]) -> None:
+        with self.lock:
+            status = str(response.get('status', order.status)).upper()
+            filled_quantity = int(response.get('filled_quantity', order.filled_quantity) or 0)
+            if status == order.status and filled_quantity == order.filled_quantity:
+                return
+
+            if order.acked == 0 and status != PENDING:
+                order.acked = time.monotonic_ns()
+                self.latencies.append((order.acked - order.submitted) / 1e9)
+                get_metrics().record('order', order.acked - order.submitted)
+            order.status = status
+            order.broker_id = response.get('id', order.broker_id)
+            order.filled_quantity = filled_quantity
+            if response.get('avg_price') is not None:
+                order.avg_price = float(response['avg_price'])
+
+            if status in FINAL_STATUS:
+                self.orders.pop(order.client_id, None)
+            update = order.copy()
+
+        self.updates.put(update)
+
+    def poll(self) -> None:
+        while self.running:
+            time.sleep(self.poll_interval)
+            now = time.monotonic_ns()
+            resting_interval = int(self.resting_poll_interval * 1e9)
+            with self.lock:
+                # Pending ones first, their request may have failed or left them out of its response
+                pending = [order for order in self.orders.values() if order.sent > 0 and order.status == PENDING]
+                resting = [order for order in self.orders.values()
+                           if order.sent > 0 and order.status != PENDING and now - order.polled >= resting_interval]
+
+            for order in pending + resting:
+                try:
+                    self.poll_limiter.acquire()
+                    order.polled = time.monotonic_ns()
+                    r = self.session.get(f'{self.base_url}/orders/{order.client_id}', timeout=self.timeout)
+                    if r.status_code == 200:
+                        self.update(order, json.loads(r.content))
+                    elif r.status_code == 404 and order.status == PENDING:
+                        # Its request already finished and the API does not know it, it was never taken
+                        self.update(order, {'status': REJECTED})
+                except Exception as e:
+                    print(f"{str(datetime.now())} - {str(e)}")
+
+    def get_updates(self) -> List[Order]:
+        updates = []
+        while True:
+            try:
+                updates.append(self.updates.get_nowait())
+            except queue.Empty:
+                return updates
+
+    def stats(self) -> Dict[str, Any]:
+        # Submit to ack latency (seconds) and orders waiting for a final status
+        latencies = np.array(self.latencies)
+        return {
+            'open_orders': len(self.orders),
+            'queued_requests': self.requests.qsize(),
+            'acks': len(latencies),
+            'p50': float(np.percentile(latencies, 50)) if len(latencies) > 0 else np.nan,
+            'p95': float(np.percentile(latencies, 95)) if len(latencies) > 0 else np.nan,
+            'max': float(latencies.max()) if len(latencies) > 0 else np.nan
+        }
+
+    def close(self) -> None:
+        self.running = False
+        self.requests.put(None)
+        self.threads[0].join()
+        self.executor.shutdown(wait=True)
+        self.session.close()
@@ -1,6 +1,9 @@
 from abc import ABC, abstractmethod
+from typing import List, Dict, Any, Optional, Sequence, Tuple
 
-from pydantic import BaseModel
+from pydantic import BaseModel, PrivateAttr
+
+from models.order_gateway import OrderGateway, Order, BUY, SELL
 
 
 class OutputSource(BaseModel, ABC):
@@ -16,10 +19,90 @@ class RESTOutputSource(OutputSource):
     def sell(self, asset_identifier: str, price: float, quantity: int):
         raise Exception(f"Method sell() must be implemented for {self.__class__.__name__}")
 
+    def submit_legs(self, legs: Sequence[Tuple[str, str, float, int]],
+                    cancel: Sequence[str] = ()) -> List[Optional[str]]:
+        # Client order ID of every leg, None for the legs filled synchronously
+        raise Exception(f"Multi-leg orders are not supported by {self.__class__.__name__}")
+
+    def get_order_updates(self) -> List[Order]:
+        # Asynchronous outputs return a client order ID from buy() and sell() and report its updates here
+        return []
+
 
 class BalanzRESTOutputSource(RESTOutputSource):
     def sell(self, asset_identifier: str, price: float, quantity: int):
         print('SELL')
 
     def buy(self, asset_identifier: str, price: float, quantity: int):
-        print('BUY')
\ No newline at end of file
+        print('BUY')
+
+
+class SimulatedOutputSource(RESTOutputSource):
+    # Fills every order at the requested price, time is set by the backtest clock
+    now: int = 0  # ns
+    fills: List[Dict[str, Any]] = []
+
+    def buy(self, asset_identifier: str, price: float, quantity: int):
+        self.fills.append({'time': self.now, 'side': 'BUY', 'identifier': asset_identifier, 'price': price,
+                           'quantity': quantity})
+
+    def sell(self, asset_identifier: str, price: float, quantity: int):
+        self.fills.append({'time': self.now, 'side': 'SELL', 'identifier': asset_identifier, 'price': price,
+                           'quantity': quantity})
+
+    def submit_legs(self, legs: Sequence[Tuple[str, str, float, int]],
+                    cancel: Sequence[str] = ()) -> List[Optional[str]]:
+        # Every leg is filled at once, there are never open orders to cancel
+        for identifier, side, price, quantity in legs:
+            self.fills.append({'time': self.now, 'side': side, 'identifier': identifier, 'price': price,
+                               'quantity': quantity})
+        return [None] * len(legs)
+
+
+class GatewayRESTOutputSource(RESTOutputSource):
+    """
+    Orders sent through an OrderGateway: buy() and sell() return a client order ID without waiting for the API,
+    the Portfolio books them when their fills are reported by get_order_updates().
+    The gateway (session pool and threads) is created on the first order, in the process that sends it.
+    """
+    base_url: str
+    headers: Dict[str, str] = {}
+    pool_size: int = 4
+    rate: float = 10  # Requests per second
+    burst: int = 10
+    poll_interval: float = 1.0  # Seconds between open orders updates
+
+    _gateway: Optional[OrderGateway] = PrivateAttr(default=None)
+
+    def __getstate__(self) -> Dict[Any, Any]:
+        # Threads and connections are not shared with other processes
+        state = super().__getstate__()
+        state['__pydantic_private__'] = {**(state['__pydantic_private__'] or {}), '_gateway': None}
+        return state
+
+    @property
+    def gateway(self) -> OrderGateway:
+        if self._gateway is None:
+            self._gateway = OrderGateway(self.base_url, headers=self.headers, pool_size=self.pool_size,
+                                         rate=self.rate, burst=self.burst, poll_interval=self.poll_interval)
+        return self._gateway
+
+    def buy(self, asset_identifier: str, price: float, quantity: int) -> str:
+        return self.gateway.submit(asset_identifier, BUY, price, quantity)
+
+    def sell(self, asset_identifier: str, price: float, quantity: int) -> str:
+        return self.gateway.submit(asset_identifier, SELL, price, quantity)
+
+    def submit_legs(self, legs: Sequence[Tuple[str, str, float, int]],
+                    cancel: Sequence[str] = ()) -> List[Optional[str]]:
+        # Multi-leg order (identifier, side, price, quantity), replacing the cancel orders, sent in one request
+        return self.gateway.submit_batch(legs, cancel)
+
+    def cancel(self, client_ids: Sequence[str]) -> None:
+        self.gateway.cancel(client_ids)
+
+    def get_order_updates(self) -> List[Order]:
+        return self._gateway.get_updates() if self._gateway is not None else []
+
+    def stats(self) -> Dict[str, Any]:
+        return self._gateway.stats() if self._gateway is not None else {}
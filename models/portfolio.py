@@ -1,26 +1,171 @@
-from copy import copy
-from typing import List
+import heapq
+import math
+from collections import deque
+from typing import List, Dict, Tuple, Optional, Deque, Sequence, Any
 
-from pydantic import BaseModel
+import numpy as np
+from pydantic import BaseModel, ConfigDict, PrivateAttr, computed_field, model_validator
 
 from models.asset import Asset
+from models.order_gateway import Order, BUY, SELL, FINAL_STATUS
 from models.output_source import OutputSource
 
 
 class Operation(BaseModel):
+    # Immutable, the lots of a PositionBook are only changed through it (edits are replaced by a copy)
+    model_config = ConfigDict(frozen=True)
+
     identifier: str
     quantity: int
     price: float
     operation_type: str  # LONG-SHORT-ETC
 
 
+# Closed lots tolerated in the indexes of an identifier before compacting them, besides twice its open lots
+COMPACT_MIN_LOTS = 64
+
+
+class PositionBook:
+    """
+    Open lots indexed by identifier and operation type, with running quantity and cost per identifier.
+    Sells close the lots of an identifier in CHEAPEST (price heap, FIFO on equal prices) or FIFO order in O(log n),
+    closed lots are dropped lazily from the heap and queue when they reach the top, and both are compacted when
+    their closed lots outnumber the open ones.
+    """
+
+    def __init__(self):
+        self.next_lot_id = 0
+        self.lots: Dict[int, Operation] = {}  # Insertion order
+        self.lots_by_type: Dict[Tuple[str, str], Dict[int, None]] = {}  # (identifier, type) -> lot IDs
+        self.quantities: Dict[str, int] = {}
+        self.costs: Dict[str, float] = {}  # Sum of price * quantity of the open lots
+        self.cheapest: Dict[str, List[Tuple[float, int]]] = {}  # identifier -> heap of (price, lot ID)
+        self.oldest: Dict[str, Deque[int]] = {}  # identifier -> lot IDs
+        self.open_lots: Dict[str, int] = {}  # identifier -> number of open lots
+
+    def add(self, operation: Operation) -> int:
+        lot_id = self.next_lot_id
+        self.next_lot_id += 1
+
+        self.lots[lot_id] = operation
+        self.lots_by_type.setdefault((operation.identifier, operation.operation_type), {})[lot_id] = None
+        self.quantities[operation.identifier] = self.quantities.get(operation.identifier, 0) + operation.quantity
+        self.costs[operation.identifier] = self.costs.get(operation.identifier, 0) + operation.price * operation.quantity
+        heapq.heappush(self.cheapest.setdefault(operation.identifier, []), (operation.price, lot_id))
+        self.oldest.setdefault(operation.identifier, deque()).append(lot_id)
+        self.open_lots[operation.identifier] = self.open_lots.get(operation.identifier, 0) + 1
+        return lot_id
+
+    def find(self, operation: Operation) -> int:
+        # Lot ID of an operation returned by the book, else of the first equal one. Only its identifier and type
+        # are scanned
+        lots_ids = self.lots_by_type.get((operation.identifier, operation.operation_type), {})
+        for lot_id in lots_ids:
+            if self.lots[lot_id] is operation:
+                return lot_id
+        for lot_id in lots_ids:
+            if self.lots[lot_id] == operation:
+                return lot_id
+        raise Exception(f"Operation {operation} not found in {self.__class__.__name__}")
+
+    def remove(self, lot_id: int) -> None:
+        operation = self.lots.pop(lot_id)
+        del self.lots_by_type[(operation.identifier, operation.operation_type)][lot_id]
+        self.quantities[operation.identifier] -= operation.quantity
+        self.costs[operation.identifier] -= operation.price * operation.quantity
+        self.open_lots[operation.identifier] -= 1
+        indexed = max(len(self.oldest[operation.identifier]), len(self.cheapest[operation.identifier]))
+        if indexed > 2 * self.open_lots[operation.identifier] + COMPACT_MIN_LOTS:
+            self.compact(operation.identifier)
+
+    def compact(self, identifier: str) -> None:
+        # Drops the closed lots of both indexes, amortized O(1) per removed lot
+        self.oldest[identifier] = deque(lot_id for lot_id in self.oldest[identifier] if lot_id in self.lots)
+        self.cheapest[identifier] = [lot for lot in self.cheapest[identifier] if lot[1] in self.lots]
+        heapq.heapify(self.cheapest[identifier])
+
+    def replace(self, lot_id: int, operation: Operation) -> None:
+        old_operation = self.lots[lot_id]
+        if (old_operation.identifier, old_operation.operation_type, old_operation.price) != (
+                operation.identifier, operation.operation_type, operation.price):
+            # Another asset, type or price changes its indexes, it is a new lot
+            self.remove(lot_id)
+            self.add(operation)
+            return
+
+        self.lots[lot_id] = operation
+        self.quantities[operation.identifier] += operation.quantity - old_operation.quantity
+        self.costs[operation.identifier] += operation.price * (operation.quantity - old_operation.quantity)
+
+    def next_lot(self, identifier: str, matching: str) -> Optional[int]:
+        if matching == 'FIFO':
+            lots = self.oldest.get(identifier, deque())
+            while len(lots) > 0 and lots[0] not in self.lots:
+                lots.popleft()
+            return lots[0] if len(lots) > 0 else None
+
+        lots = self.cheapest.get(identifier, [])
+        while len(lots) > 0 and lots[0][1] not in self.lots:
+            heapq.heappop(lots)
+        return lots[0][1] if len(lots) > 0 else None
+
+    def remove_quantity(self, identifier: str, quantity: int, matching: str) -> None:
+        current_q = quantity
+        while current_q > 0:
+            lot_id = self.next_lot(identifier, matching)
+            if lot_id is None:
+                break
+
+            operation = self.lots[lot_id]
+            if operation.quantity > current_q:
+                self.replace(lot_id, operation.model_copy(update={'quantity': operation.quantity - current_q}))
+                break
+            self.remove(lot_id)
+            current_q -= operation.quantity
+
+    def get_by_type(self, identifier: str, operation_type: str) -> List[Operation]:
+        return [self.lots[lot_id] for lot_id in self.lots_by_type.get((identifier, operation_type), {})]
+
+    def get_positions(self, identifiers: Sequence[str]) -> Tuple[np.ndarray, np.ndarray]:
+        # Open quantity and cost of every identifier, 0 without open lots
+        return (
+            np.fromiter((self.quantities.get(i, 0) for i in identifiers), dtype=np.float64, count=len(identifiers)),
+            np.fromiter((self.costs.get(i, 0.0) for i in identifiers), dtype=np.float64, count=len(identifiers))
+        )
+
+
 class Portfolio(BaseModel):
     liquid: float
     output: OutputSource
-    open_operations: List[Operation] = []
+    matching: str = 'CHEAPEST'  # Lots closed first when selling: CHEAPEST or FIFO
+
+    _book: PositionBook = PrivateAttr(default_factory=PositionBook)
+    # Asynchronous outputs: client order ID -> (side, order, filled quantity, filled amount)
+    _orders: Dict[str, Tuple[str, Operation, int, float]] = PrivateAttr(default_factory=dict)
+    _reserved: Dict[str, int] = PrivateAttr(default_factory=dict)  # identifier -> quantity of pending sells
+
+    @model_validator(mode='wrap')
+    @classmethod
+    def seed_book(cls, data: Any, handler: Any) -> 'Portfolio':
+        # open_operations is not a field, the given ones (constructor or model_dump()) are added to the book
+        operations = []
+        if isinstance(data, dict) and 'open_operations' in data:
+            data = dict(data)
+            operations = data.pop('open_operations') or []
+        portfolio = handler(data)
+        for operation in operations:
+            portfolio._book.add(operation if isinstance(operation, Operation) else Operation.model_validate(operation))
+        return portfolio
+
+    @computed_field
+    @property
+    def open_operations(self) -> Tuple[Operation, ...]:
+        # Read only view of the open lots, they are changed through add_operation, remove_operation and
+        # edit_operation
+        return tuple(self._book.lots.values())
 
     def add_operation(self, asset: Asset, price: float, quantity: int, operation_type: str) -> None:
-        self.open_operations.append(Operation(
+        self._book.add(Operation(
             identifier=asset.identifier,
             quantity=quantity,
             price=price,
@@ -28,59 +173,129 @@ class Portfolio(BaseModel):
         ))
 
     def remove_operation(self, operation: Operation) -> None:
-        self.open_operations.remove(operation)
+        self._book.remove(self._book.find(operation))
 
     def edit_operation(self, old_operation: Operation, new_operation: Operation) -> None:
-        self.open_operations[self.open_operations.index(old_operation)] = new_operation
+        self._book.replace(self._book.find(old_operation), new_operation)
 
     def remove_asset_quantity(self, asset: Asset, quantity: int) -> None:
-        current_q = quantity
-        ops = [
-            operation
-            for operation in self.open_operations
-            if asset.identifier == operation.identifier
-        ]
-        ops.sort(key=lambda o: o.price)  # First = cheap
-        for operation in ops:
-            if operation.quantity == current_q:
-                self.remove_operation(operation)
-                break
-            elif operation.quantity > current_q:
-                new_operation = copy(operation)
-                new_operation.quantity -= current_q
-                self.edit_operation(operation, new_operation)
-                break
-            else:
-                self.remove_operation(operation)
-                current_q -= operation.quantity
+        self._book.remove_quantity(asset.identifier, quantity, self.matching)
 
     def get_operations_by_type_and_asset(self, asset: Asset, filter_type: str) -> List[Operation]:
-        return [
-            operation
-            for operation in self.open_operations
-            if operation.operation_type == filter_type and asset.identifier == operation.identifier
-        ]
+        return self._book.get_by_type(asset.identifier, filter_type)
 
     def get_quantity_by_asset(self, asset: Asset) -> int:
-        return sum([
-            operation.quantity
-            for operation in self.open_operations
-            if operation.identifier == asset.identifier
-        ])
+        return self._book.quantities.get(asset.identifier, 0)
+
+    def get_cost_by_asset(self, asset: Asset) -> float:
+        # Price paid for the open quantity of the asset
+        return self._book.costs.get(asset.identifier, 0.0)
+
+    def get_positions(self, identifiers: Sequence[str]) -> Tuple[np.ndarray, np.ndarray]:
+        # Arrays of the open quantity and cost of every identifier, aligned with identifiers
+        return self._book.get_positions(identifiers)
+
+    def get_available_quantity(self, asset: Asset) -> int:
+        # Open quantity not reserved by pending sells
+        return self.get_quantity_by_asset(asset) - self._reserved.get(asset.identifier, 0)
 
     def buy(self, asset: Asset, price: float, quantity: int, operation_type: str):
         total_amount = price * quantity
         if self.liquid >= total_amount:
             self.liquid -= total_amount
-            self.output.buy(asset.identifier, price, quantity)
-            self.add_operation(asset, price, quantity, operation_type)
+            order_id = self.output.buy(asset.identifier, price, quantity)
+            if order_id is None:
+                self.add_operation(asset, price, quantity, operation_type)
+            else:
+                # Liquidity stays reserved until the order is filled or closed
+                self.track_order(order_id, BUY, asset, price, quantity, operation_type)
         else:
             print(
                 f'Error when buying {operation_type} {quantity} {asset.identifier} assets at {price} because liquidity = {self.liquid}')
 
     def sell(self, asset: Asset, price: float, quantity: int):
-        asset_q = self.get_quantity_by_asset(asset)
+        asset_q = self.get_available_quantity(asset)
         if asset_q >= quantity:
-            self.output.sell(asset.identifier, price, quantity)
-            self.liquid += price * quantity
-            self.remove_asset_quantity(asset, quantity)
+            order_id = self.output.sell(asset.identifier, price, quantity)
+            if order_id is None:
+                self.liquid += price * quantity
+                self.remove_asset_quantity(asset, quantity)
+            else:
+                self.track_order(order_id, SELL, asset, price, quantity, '')
+
+    def submit_legs(self, legs: Sequence[Tuple[Asset, str, float, int, str]],
+                    cancel: Sequence[str] = ()) -> List[Optional[str]]:
+        """
+        Multi-leg order (asset, side, price, quantity, operation_type) sent in one request by outputs supporting
+        it (GatewayRESTOutputSource), replacing the cancel orders. Nothing is sent if the portfolio cannot cover
+        every leg. Returns the client order IDs of the legs, None for the legs filled at once (simulated outputs).
+        """
+        amount = sum(price * quantity for _, side, price, quantity, _ in legs if side == BUY)
+        sold: Dict[str, int] = {}
+        for asset, side, _, quantity, _ in legs:
+            if side == SELL:
+                sold[asset.identifier] = sold.get(asset.identifier, 0) + quantity
+        assets = {asset.identifier: asset for asset, *_ in legs}
+        if self.liquid < amount or any(self.get_available_quantity(assets[i]) < q for i, q in sold.items()):
+            print(f'Error when sending {len(legs)} legs order because liquidity = {self.liquid}')
+            return []
+
+        # Sent first, nothing is reserved if the output does not take the order
+        order_ids = self.output.submit_legs(
+            [(asset.identifier, side, price, quantity) for asset, side, price, quantity, _ in legs], cancel
+        )
+        self.liquid -= amount
+        for order_id, (asset, side, price, quantity, operation_type) in zip(order_ids, legs):
+            if order_id is not None:
+                self.track_order(order_id, side, asset, price, quantity, operation_type)
+            elif side == BUY:
+                self.add_operation(asset, price, quantity, operation_type)
+            else:
+                self.liquid += price * quantity
+                self.remove_asset_quantity(asset, quantity)
+        return order_ids
+
+    def track_order(self, order_id: str, side: str, asset: Asset, price: float, quantity: int,
+                    operation_type: str) -> None:
+        self._orders[order_id] = (side, Operation(
+            identifier=asset.identifier,
+            quantity=quantity,
+            price=price,
+            operation_type=operation_type
+        ), 0, 0.0)
+        if side == SELL:
+            self._reserved[asset.identifier] = self._reserved.get(asset.identifier, 0) + quantity
+
+    def process_order_updates(self) -> None:
+        # Books the fills reported by the output since the last call, and releases what closed orders left unfilled
+        for order in self.output.get_order_updates():
+            self.process_order_update(order)
+
+    def process_order_update(self, order: Order) -> None:
+        if order.client_id not in self._orders.keys():
+            return
+
+        side, operation, filled, filled_amount = self._orders[order.client_id]
+        quantity = min(order.filled_quantity, operation.quantity) - filled
+        if quantity > 0:
+            fill_price = operation.price if math.isnan(order.avg_price) else order.avg_price
+            total_amount = order.filled_quantity * fill_price
+            amount = total_amount - filled_amount
+            if side == BUY:
+                # Reserved at the order price, booked at the fill price
+                self.liquid += operation.price * quantity - amount
+                self._book.add(operation.model_copy(update={'quantity': quantity, 'price': amount / quantity}))
+            else:
+                self.liquid += amount
+                self._book.remove_quantity(operation.identifier, quantity, self.matching)
+                self._reserved[operation.identifier] -= quantity
+            filled, filled_amount = filled + quantity, total_amount
+            self._orders[order.client_id] = (side, operation, filled, filled_amount)
+
+        if order.status in FINAL_STATUS:
+            unfilled = operation.quantity - filled
+            if side == BUY:
+                self.liquid += operation.price * unfilled
+            else:
+                self._reserved[operation.identifier] -= unfilled
+            del self._orders[order.client_id]
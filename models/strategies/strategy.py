@@ -1,8 +1,9 @@
 from abc import ABC, abstractmethod
-from typing import List, Any, Dict
+from typing import List, Any, Dict, Optional, Tuple
 
+import numpy as np
 import pandas as pd
-from pydantic import BaseModel, model_validator
+from pydantic import BaseModel, PrivateAttr, model_validator
 
 from models.asset import Asset
 from models.indicators.indicator import Indicator
@@ -27,6 +28,10 @@ class StrategyConfiguration(BaseModel):
 class Strategy(BaseModel, ABC):
     config: StrategyConfiguration
 
+    # Set by the Agent before every evaluation, None without a VolatilitySurface
+    _surface_snapshot: Optional[Tuple[int, np.ndarray, float]] = PrivateAttr(default=None)
+    _portfolio_risk: Optional[Dict[str, Any]] = PrivateAttr(default=None)
+
     def __hash__(self):
         return self.__str__().__hash__()
 
@@ -76,3 +81,29 @@ class Strategy(BaseModel, ABC):
             timeframed_assets_definition_map: Dict[str, str]  # Dict timeframe -> list of tickers
     ):
         raise Exception(f"evaluate method must be implemented in class {self.__class__.__name__}")
+
+    def evaluate_arrays(self, plan: Any):
+        """
+        Array based evaluation, without DataFrames. plan is the EvaluationPlan of the activation ticker with its
+        slots filled: real_time_assets, timeframed_assets and timeframed_indicators hold preallocated arrays
+        (slot.times, slot.values, slot.column(name), slot.last(name)), and books the OrderBook of every real time
+        asset (microprice, spread, imbalance, vwap), surface and surface_snapshot the VolatilitySurface and its last
+        published values, and portfolio_risk the risk of the portfolio with them.
+        Strategies that do not implement it are evaluated with evaluate().
+        """
+        raise Exception(f"evaluate_arrays method must be implemented in class {self.__class__.__name__}")
+
+    def get_surface(self) -> Optional[Tuple[int, np.ndarray, float]]:
+        """
+        (version, nodes x SURFACE_FIELDS view, spot) of the implied volatility surface when the evaluation started,
+        nodes in OptionChain order. The view is not copied, so it is only valid during the evaluation.
+        """
+        return self._surface_snapshot
+
+    def get_risk(self) -> Optional[Dict[str, Any]]:
+        # PnL, net greeks and exposure of the portfolio with that surface (PortfolioRisk.update()), None without
+        # positions in its option chain
+        return self._portfolio_risk
+
+    def has_arrays(self) -> bool:
+        return type(self).evaluate_arrays is not Strategy.evaluate_arrays
@@ -0,0 +1,60 @@
+import math
+from datetime import datetime
+from time import monotonic_ns
+from typing import List, Sequence
+
+import numpy as np
+import pandas as pd
+
+TICK_COLUMNS = ['last_price', 'volume'] + [
+    f'box_{side}_{field}_{level}'
+    for side in ['buy', 'sell']
+    for level in range(1, 8)
+    for field in ['price', 'quantity']
+]
+LAST_PRICE, VOLUME = 0, 1
+
+
+def now_ns() -> int:
+    # Local wall clock, same reference as datetime.now() used across the stores
+    return int(np.datetime64(datetime.now(), 'ns').astype(np.int64))
+
+
+class Tick:
+    """
+    Compact market data update: values holds one float per TICK_COLUMNS position (NaN if missing).
+    """
+    __slots__ = ('source_ticker', 'time', 'values', 'received')
+
+    def __init__(self, source_ticker: str, time: int, values: List[float], received: int = 0):
+        self.source_ticker = source_ticker  # <source_name>#<ticker>
+        self.time = time  # ns
+        self.values = values
+        self.received = received  # Monotonic ns when the source received it, 0 if unknown (ej: backtests)
+
+    def __reduce__(self):
+        return Tick, (self.source_ticker, self.time, self.values, self.received)
+
+    @property
+    def last_price(self) -> float:
+        return self.values[LAST_PRICE]
+
+    @property
+    def volume(self) -> float:
+        return self.values[VOLUME]
+
+    @staticmethod
+    def from_fields(source_ticker: str, time: int, message: dict, fields: Sequence[str]) -> 'Tick':
+        # fields: message keys in TICK_COLUMNS order
+        values = [message.get(field, None) for field in fields]
+        return Tick(source_ticker, time, [math.nan if value is None else float(value) for value in values],
+                    monotonic_ns())
+
+
+def ticks_to_frame(ticks: Sequence[Tick]) -> pd.DataFrame:
+    # Only for consumers that need a DataFrame, the pipeline works with the ticks
+    return pd.DataFrame(
+        [tick.values for tick in ticks],
+        columns=TICK_COLUMNS,
+        index=pd.DatetimeIndex(np.array([tick.time for tick in ticks], dtype='datetime64[ns]'), name='time')
+    )
@@ -0,0 +1,281 @@
+import csv
+import glob
+import os
+from abc import ABC, abstractmethod
+from datetime import datetime, date
+from typing import Dict, Optional, TextIO, List, Any, Tuple
+
+import pandas as pd
+
+try:
+    import pyarrow as pa
+    import pyarrow.compute as pc
+    import pyarrow.dataset as ds
+    import pyarrow.parquet as pq
+except ImportError:  # Only needed by ParquetStorage
+    pa = None
+
+# Ticker prefix -> underlying, used to partition the options by their underlying
+UNDERLYINGS = {'GFG': 'GGAL'}
+
+
+def get_underlying(ticker: str) -> str:
+    for prefix, underlying in UNDERLYINGS.items():
+        if ticker.startswith(prefix):
+            return underlying
+    return ticker
+
+
+class Storage(ABC):
+    """
+    Destination of the recorded data. Prefixes look like OPERATIONS-<ticker> (intraday operations, appended)
+    or METADATA-... (snapshots, rewritten).
+    """
+
+    @abstractmethod
+    def write(self, df: pd.DataFrame, prefix: str, filter_by_seq_number: bool = True, mode: str = 'a') -> int:
+        # Returns the number of rows written
+        raise Exception(f"Method write() must be implemented for {self.__class__.__name__}")
+
+    def close(self) -> None:
+        pass
+
+
+class CSVStorage(Storage):
+    """
+    One CSV per prefix and day: <root>/<prefix>-<date>.csv, appended through buffered handles.
+    The last nrosecuencia written to every file is kept in memory and recovered from the file tail when opened.
+    """
+
+    def __init__(self, root: str = 'data'):
+        self.root = root
+        self.watermarks: Dict[str, Optional[int]] = {}  # path -> last nrosecuencia
+        self.open_files: Dict[str, TextIO] = {}  # prefix -> append handle
+
+    def get_path(self, prefix: str) -> str:
+        return os.path.join(self.root, "-".join([prefix, str(datetime.now().date())]) + '.csv')
+
+    @staticmethod
+    def read_last_seq_number(csv_path: str) -> Optional[int]:
+        """
+        Rows are appended sorted by nrosecuencia, so only the header and the last lines are needed.
+        A last line without its newline was cut by a crash mid-write: it is truncated from the file, so the next
+        rows start on a clean line, and the watermark comes from the previous complete row.
+        """
+        with open(csv_path, 'rb+') as file:
+            header = file.readline()
+            if not header.endswith(b'\n'):
+                # Not even the header was completed, it is written again with the next rows
+                file.truncate(0)
+                return None
+
+            file.seek(0, os.SEEK_END)
+            position = file.tell()
+            tail = b''
+            while position > len(header) and tail.count(b'\n') < 3:
+                step = min(4096, position - len(header))
+                position -= step
+                file.seek(position)
+                tail = file.read(step) + tail
+
+            if not tail.endswith(b'\n'):
+                complete = tail.rfind(b'\n') + 1
+                file.truncate(position + complete)
+                tail = tail[:complete]
+
+        lines = tail.split(b'\n')
+        if position > len(header):
+            # The first line of the tail may start before it
+            lines = lines[1:]
+
+        columns = next(csv.reader([header.decode()]))
+        for line in reversed(lines):
+            try:
+                return int(next(csv.reader([line.decode()]))[columns.index('nrosecuencia')])
+            except (ValueError, IndexError, StopIteration, UnicodeDecodeError):
+                continue
+        return None
+
+    def get_file(self, prefix: str, path: str, recover_watermark: bool) -> TextIO:
+        # One append handle per prefix, rotated when the day (and so the path) changes
+        if prefix in self.open_files.keys() and self.open_files[prefix].name != path:
+            self.close_file(prefix)
+
+        if prefix not in self.open_files.keys():
+            if recover_watermark and os.path.isfile(path):
+                # Recovering the watermark once, when the file is opened
+                self.watermarks[path] = self.read_last_seq_number(path)
+            self.open_files[prefix] = open(path, mode='a', buffering=1024 * 1024)
+
+        return self.open_files[prefix]
+
+    def close_file(self, prefix: str) -> None:
+        file = self.open_files.pop(prefix)
+        self.watermarks.pop(file.name, None)
+        file.flush()
+        os.fsync(file.fileno())
+        file.close()
+
+    def close(self) -> None:
+        for prefix in list(self.open_files.keys()):
+            self.close_file(prefix)
+
+    def write(self, df: pd.DataFrame, prefix: str, filter_by_seq_number: bool = True, mode: str = 'a') -> int:
+        path = self.get_path(prefix)
+
+        if mode == 'w':
+            # Snapshots are rewritten every time
+            df.to_csv(path, mode=mode, header=True)
+            return len(df)
+
+        file = self.get_file(prefix, path, recover_watermark=filter_by_seq_number)
+        if filter_by_seq_number and self.watermarks.get(path, None) is not None:
+            df = df[df['nrosecuencia'] > self.watermarks[path]]
+
+        if len(df) > 0:
+            df.to_csv(file, header=file.tell() == 0)
+            file.flush()
+            if filter_by_seq_number:
+                self.watermarks[path] = int(df['nrosecuencia'].max())
+
+        return len(df)
+
+
+class ParquetStorage(Storage):
+    """
+    Compressed columnar files partitioned by date, underlying and ticker:
+
+        <root>/operations/date=<YYYY-MM-DD>/underlying=<underlying>/ticker=<ticker>/part-<time>.parquet
+        <root>/metadata/<prefix>-<date>.parquet
+
+    Every poll writes a small part file, compact() merges the parts of each partition into one file.
+    """
+
+    def __init__(self, root: str = 'data', compression: str = 'zstd'):
+        if pa is None:
+            raise Exception(f"pyarrow must be installed to use {self.__class__.__name__}")
+
+        self.root = root
+        self.compression = compression
+        self.watermarks: Dict[str, Optional[int]] = {}  # partition -> last nrosecuencia
+
+    @property
+    def operations_root(self) -> str:
+        return os.path.join(self.root, 'operations')
+
+    def get_partition(self, ticker: str, day: date) -> str:
+        return os.path.join(
+            self.operations_root, f'date={str(day)}', f'underlying={get_underlying(ticker)}', f'ticker={ticker}'
+        )
+
+    def get_watermark(self, partition: str) -> Optional[int]:
+        if partition not in self.watermarks.keys():
+            # Recovering the watermark once per partition, reading only the sequence column
+            parts = glob.glob(os.path.join(partition, '*.parquet'))
+            sequences = [
+                pc.max(pq.read_table(part, columns=['nrosecuencia'])['nrosecuencia']).as_py()
+                for part in parts
+            ]
+            sequences = [sequence for sequence in sequences if sequence is not None]
+            self.watermarks[partition] = max(sequences) if len(sequences) > 0 else None
+
+        return self.watermarks[partition]
+
+    def write(self, df: pd.DataFrame, prefix: str, filter_by_seq_number: bool = True, mode: str = 'a') -> int:
+        now = datetime.now()
+
+        if mode == 'w' or not prefix.startswith('OPERATIONS-'):
+            os.makedirs(os.path.join(self.root, 'metadata'), exist_ok=True)
+            path = os.path.join(self.root, 'metadata', f'{prefix}-{str(now.date())}.parquet')
+            df.to_parquet(path, compression=self.compression)
+            return len(df)
+
+        ticker = prefix[len('OPERATIONS-'):]
+        partition = self.get_partition(ticker, now.date())
+
+        # Days are partitions, so a new day starts with a new watermark
+        for old_partition in [p for p in list(self.watermarks) if f'date={str(now.date())}' not in p]:
+            self.watermarks.pop(old_partition, None)
+
+        watermark = self.get_watermark(partition) if filter_by_seq_number else None
+        if watermark is not None:
+            df = df[df['nrosecuencia'] > watermark]
+
+        if len(df) > 0:
+            os.makedirs(partition, exist_ok=True)
+            df.to_parquet(
+                os.path.join(partition, f'part-{now.strftime("%H%M%S%f")}.parquet'),
+                compression=self.compression,
+                index=False
+            )
+            if filter_by_seq_number:
+                self.watermarks[partition] = int(df['nrosecuencia'].max())
+
+        return len(df)
+
+    def compact(self, day: Optional[date] = None) -> int:
+        """
+        Merges the part files of every partition of the day (all days if None) into a single sorted file.
+        Returns the number of partitions compacted.
+        """
+        pattern = f'date={str(day)}' if day is not None else 'date=*'
+        compacted = 0
+
+        for partition in glob.glob(os.path.join(self.operations_root, pattern, 'underlying=*', 'ticker=*')):
+            parts = sorted(glob.glob(os.path.join(partition, 'part-*.parquet')))
+            if len(parts) == 0:
+                continue
+
+            existing = [os.path.join(partition, 'data.parquet')] if os.path.isfile(
+                os.path.join(partition, 'data.parquet')) else []
+            table = pa.concat_tables(
+                [pq.read_table(path) for path in existing + parts], promote_options='default'
+            ).sort_by('nrosecuencia')
+
+            # Written aside (hidden from readers by the dot) and renamed so they never see a half written file
+            tmp_path = os.path.join(partition, '.data.parquet.tmp')
+            pq.write_table(table, tmp_path, compression=self.compression)
+            os.replace(tmp_path, os.path.join(partition, 'data.parquet'))
+            for part in parts:
+                os.remove(part)
+            compacted += 1
+
+        return compacted
+
+
+def read_operations(
+        root: str,
+        start: date,
+        end: date,
+        columns: Optional[List[str]] = None,
+        filters: Optional[List[Tuple[str, str, Any]]] = None
+) -> pd.DataFrame:
+    """
+    Loads the operations recorded by ParquetStorage between start and end (inclusive).
+
+    columns: projection, only these columns are read
+    filters: predicates pushed down to the scan, ej: [('underlying', '==', 'GGAL'), ('ticker', 'in', [...])]
+    """
+    if pa is None:
+        raise Exception("pyarrow must be installed to read the parquet operations")
+
+    dataset = ds.dataset(
+        os.path.join(root, 'operations'),
+        format='parquet',
+        partitioning=ds.partitioning(
+            pa.schema([('date', pa.string()), ('underlying', pa.string()), ('ticker', pa.string())]),
+            flavor='hive'
+        )
+    )
+
+    expression = (ds.field('date') >= str(start)) & (ds.field('date') <= str(end))
+    operators = {
+        '==': lambda f, v: f == v, '!=': lambda f, v: f != v,
+        '>': lambda f, v: f > v, '>=': lambda f, v: f >= v,
+        '<': lambda f, v: f < v, '<=': lambda f, v: f <= v,
+        'in': lambda f, v: f.isin(v)
+    }
+    for column, operator, value in filters or []:
+        expression = expression & operators[operator](ds.field(column), value)
+
+    return dataset.to_table(columns=columns, filter=expression).to_pandas()